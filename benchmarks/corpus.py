@@ -0,0 +1,122 @@
+"""
+Fixed benchmark corpus of Lean proofs, statements and rubric pairs.
+
+Everything is generated from templates with a seeded random.Random, so a given
+(mix, size, seed) always yields the same inputs and runs stay comparable. The
+proofs only use core Lean, so they check quickly without Mathlib.
+"""
+
+import random
+import re
+
+# {i} makes each instance distinct, so the "mixed" corpus does not hit the cache.
+VALID_TEMPLATES = (
+    "theorem bench_add_comm_{i} (a b : Nat) : a + b + {i} = b + a + {i} := by\n  rw [Nat.add_comm a b]",
+    "theorem bench_zero_add_{i} (n : Nat) : 0 + n + {i} = n + {i} := by\n  simp",
+    "theorem bench_lt_{i} : {i} < {i} + 1 := Nat.lt_succ_self {i}",
+    "theorem bench_list_{i} : [1, 2, {i}].length = 3 := rfl",
+    "theorem bench_and_{i} (p q : Prop) (hp : p) (hq : q) : q ∧ p := by\n  exact ⟨hq, hp⟩",
+    "theorem bench_decide_{i} : {i} * 2 = {i} + {i} := by decide",
+)
+INVALID_TEMPLATES = (
+    "theorem bench_bad_eq_{i} : {i} + 1 = {i} := rfl",
+    "theorem bench_bad_tactic_{i} (a b : Nat) : a * b = b + a := by\n  rw [Nat.mul_comm]",
+    "theorem bench_bad_type_{i} (n : Nat) : n = \"{i}\" := by simp",
+    "theorem bench_unknown_{i} (n : Nat) : n ≤ n + {i} := by\n  exact Nat.no_such_lemma n",
+)
+# Kernel reduction heavy enough to run into the wall-clock limit instead of failing fast.
+TIMEOUT_TEMPLATES = (
+    "set_option maxHeartbeats 0 in\n"
+    "set_option maxRecDepth 1000000 in\n"
+    "theorem bench_slow_{i} : (List.range (200000 + {i})).foldl (· + ·) 0 ="
+    " (List.range (200000 + {i})).foldl (· + ·) 0 + 0 := by\n"
+    "  decide",
+)
+# Rejected by the lexical pre-filter without running Lean.
+PREFILTER_TEMPLATES = (
+    "",
+    "theorem bench_sorry_{i} (n : Nat) : n = n := sorry",
+    "theorem bench_open_{i} (n : Nat) : (n + {i} = n := rfl",
+)
+
+# Shares of each kind in the "mixed" corpus.
+MIXED_SHARES = (("valid", 0.5), ("invalid", 0.3), ("timeout", 0.05), ("prefilter", 0.15))
+# Distinct proofs behind the "duplicates" corpus, which mimics many rollouts per problem.
+DUPLICATE_POOL = 12
+
+_TEMPLATES = {
+    "valid": VALID_TEMPLATES,
+    "invalid": INVALID_TEMPLATES,
+    "timeout": TIMEOUT_TEMPLATES,
+    "prefilter": PREFILTER_TEMPLATES,
+}
+
+
+def proof(kind: str, i: int) -> str:
+    templates = _TEMPLATES[kind]
+    return templates[i % len(templates)].format(i=i)
+
+
+def proofs(mix: str, size: int, seed: int = 0) -> list[str]:
+    """
+    size proofs of the given mix: "valid", "invalid", "timeout", "prefilter",
+    "mixed" (MIXED_SHARES) or "duplicates" (drawn from DUPLICATE_POOL mixed proofs).
+    """
+    rng = random.Random(seed)
+    if mix in _TEMPLATES:
+        return [proof(mix, i) for i in range(size)]
+    if mix == "mixed":
+        kinds = [kind for kind, _ in MIXED_SHARES]
+        weights = [share for _, share in MIXED_SHARES]
+        return [proof(rng.choices(kinds, weights)[0], i) for i in range(size)]
+    if mix == "duplicates":
+        distinct = proofs("mixed", DUPLICATE_POOL, seed)
+        return [rng.choice(distinct) for _ in range(size)]
+    raise ValueError(f"Unknown corpus mix: {mix}")
+
+
+def statements(size: int, seed: int = 0) -> list[str]:
+    """Statements for the statement-only check: the proofs of a mixed corpus."""
+    return proofs("mixed", size, seed)
+
+
+_NAMES = ("a", "b", "c", "n", "m", "x", "y", "z")
+
+
+def _statement(rng: random.Random, i: int) -> tuple[str, list[str]]:
+    names = rng.sample(_NAMES, 3)
+    a, b, c = names
+    shapes = (
+        f"theorem gt_{i} ({a} {b} : ℕ) (h : {a} < {b}) : {a} + {i} < {b} + {i}",
+        f"theorem gt_{i} ({a} {b} {c} : ℝ) (h₀ : 0 < {c}) : {a} * {c} + {b} * {c} = ({a} + {b}) * {c}",
+        f"theorem gt_{i} ({a} : ℤ) (h : {a} % 2 = 1) : ({a} ^ 2 + {i}) % 2 = ({i} + 1) % 2",
+        f"theorem gt_{i} (f : ℕ → ℕ) (h : ∀ {a}, f ({a} + 1) > f {a}) : StrictMono f",
+    )
+    return shapes[i % len(shapes)], names
+
+
+def rubric_pairs(size: int, seed: int = 0) -> list[tuple[str, str]]:
+    """
+    (prediction, ground truth) pairs in roughly the proportions of autoformalization
+    rollouts: renamed copies (decided locally), perturbed statements (sent to the
+    model) and non-statements.
+    """
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(size):
+        ground_truth, names = _statement(rng, i)
+        roll = rng.random()
+        if roll < 0.3:
+            renaming = dict(zip(names, ("p", "q", "r")))
+            renamed = re.sub(r"\b[a-z]\b", lambda m: renaming.get(m.group(), m.group()), ground_truth)
+            prediction = renamed.replace(f"gt_{i}", f"pred_{i}")
+        elif roll < 0.9:
+            prediction = (
+                ground_truth.replace(f"gt_{i}", f"pred_{i}")
+                .replace("<", "≤", 1)
+                .replace(f" {i}", f" {i + rng.randint(1, 9)}", 1)
+            )
+        else:
+            prediction = rng.choice(("", "I could not formalize this statement.", "lemma"))
+        pairs.append((prediction, ground_truth))
+    return pairs
@@ -0,0 +1,281 @@
+"""
+Reward-function benchmarks with a recorded baseline.
+
+Replays the fixed corpus (benchmarks/corpus.py) through the Lean reward functions and
+the rubric scorers and reports, per scenario, p50/p95/p99 latency per call, throughput
+in items per second, and peak memory. Each scenario runs in a fresh spawned process
+with its own environment, so caches, warm pools and peak RSS do not leak between
+scenarios. The rubric scenarios talk to reward_rubric.mock_openai_server.
+
+    python -m benchmarks.reward_bench                          # run, compare to baseline.json
+    python -m benchmarks.reward_bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.reward_bench --scenarios rubric_local,rubric_openai_batch
+
+Baselines are machine-specific: record one on the machine (and lean_env) that later
+runs are compared on. A scenario regresses when its p95 latency grows, or its
+throughput drops, by more than --threshold; the command then exits with status 1.
+Lean scenarios are skipped when `lake` or lean_env/ is missing, since every check
+would just return "Lean environment not found" in microseconds.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+
+from benchmarks import corpus
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+BATCH_SIZE = 32
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    description: str
+    # Corpus items per run at --size 1.0.
+    items: int
+    needs_lean: bool = False
+    # Applied before any reward module is imported, since they read it at import time.
+    env: dict = field(default_factory=dict)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("proof_sequential", "lean_proof_reward, one call per mixed proof, cache off",
+                 200, needs_lean=True, env={"LEAN_REWARD_CACHE_SIZE": "0"}),
+        Scenario("proof_cached", "lean_proof_reward, one call per proof of a duplicate-heavy mix",
+                 400, needs_lean=True),
+        Scenario("proof_batch", f"lean_proof_reward_batch, {BATCH_SIZE} mixed proofs per call, cache off",
+                 320, needs_lean=True, env={"LEAN_REWARD_CACHE_SIZE": "0"}),
+        Scenario("statement_batch", f"lean_statement_check_batch, {BATCH_SIZE} statements per call, cache off",
+                 320, needs_lean=True, env={"LEAN_REWARD_CACHE_SIZE": "0"}),
+        Scenario("rubric_local", "compute_rubric_score_local, one call per pair",
+                 20000, env={"LEAN_RUBRIC_NORMALIZE_CACHE_SIZE": "0"}),
+        Scenario("rubric_openai_batch", "compute_rubric_score_openai_batch against the mock server, 64 pairs per call",
+                 2048, env={"LEAN_RUBRIC_LOCAL_THRESHOLD": "2", "LEAN_RUBRIC_CACHE_SIZE": "0",
+                            "LEAN_RUBRIC_RPM": "0", "LEAN_RUBRIC_TPM": "0"}),
+    )
+}
+
+
+def lean_available() -> str | None:
+    """None if Lean scenarios can run, else why not."""
+    if shutil.which("lake") is None:
+        return "lake not found on PATH"
+    if not (REPO_ROOT / "lean_env").exists():
+        return f"{REPO_ROOT / 'lean_env'} not found"
+    return None
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _timed_calls(fn, inputs: list) -> list[float]:
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _run(name: str, items: int, mock_latency: float) -> tuple[list[float], int]:
+    """(latency of each timed call, items processed). Reward modules are imported here."""
+    if name == "proof_sequential":
+        from reward_fn.lean_reward import lean_proof_reward
+
+        proofs = corpus.proofs("mixed", items)
+        lean_proof_reward(corpus.proof("valid", -1))  # warm-up: pool start, first compile
+        return _timed_calls(lean_proof_reward, proofs), len(proofs)
+    if name == "proof_cached":
+        from reward_fn.lean_reward import lean_proof_reward
+
+        proofs = corpus.proofs("duplicates", items)
+        return _timed_calls(lean_proof_reward, proofs), len(proofs)
+    if name == "proof_batch":
+        from reward_fn.lean_reward import lean_proof_reward_batch
+
+        proofs = corpus.proofs("mixed", items)
+        lean_proof_reward_batch([(corpus.proof("valid", -1), None)])
+        batches = [[(proof, None) for proof in chunk] for chunk in _chunks(proofs, BATCH_SIZE)]
+        return _timed_calls(lean_proof_reward_batch, batches), len(proofs)
+    if name == "statement_batch":
+        from reward_fn.lean_reward import lean_statement_check_batch
+
+        statements = corpus.statements(items)
+        lean_statement_check_batch([corpus.proof("valid", -1)])
+        return _timed_calls(lean_statement_check_batch, _chunks(statements, BATCH_SIZE)), len(statements)
+    if name == "rubric_local":
+        from reward_rubric.lean_similarity import compute_rubric_score_local
+
+        pairs = corpus.rubric_pairs(items)
+        return _timed_calls(lambda pair: compute_rubric_score_local(pair[0], pair[1], {}), pairs), len(pairs)
+    if name == "rubric_openai_batch":
+        from reward_rubric.mock_openai_server import serve_in_thread
+
+        server, base_url = serve_in_thread(latency_s=mock_latency)
+        os.environ["LEAN_RUBRIC_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+        from reward_rubric.lean_rubric_openai import compute_rubric_score_openai_batch
+
+        pairs = [(prediction, ground_truth, {}) for prediction, ground_truth in corpus.rubric_pairs(items)]
+        try:
+            return _timed_calls(compute_rubric_score_openai_batch, _chunks(pairs, 64)), len(pairs)
+        finally:
+            server.shutdown()
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def _quantiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else None
+        return {"p50_s": value, "p95_s": value, "p99_s": value}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_s": cuts[49], "p95_s": cuts[94], "p99_s": cuts[98]}
+
+
+def run_scenario(name: str, size: float, mock_latency: float) -> dict:
+    """Run one scenario in the current process; meant for a fresh worker process."""
+    scenario = SCENARIOS[name]
+    for key, value in scenario.env.items():
+        os.environ[key] = value
+    sys.path.insert(0, str(REPO_ROOT))
+    items = max(int(scenario.items * size), 1)
+    start = time.perf_counter()
+    latencies, processed = _run(name, items, mock_latency)
+    wall_s = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux. RUSAGE_CHILDREN only covers Lean processes that
+    # have exited, so warm pool workers still running are not in it.
+    return {
+        "description": scenario.description,
+        "items": processed,
+        "calls": len(latencies),
+        "wall_s": wall_s,
+        "throughput_per_s": processed / wall_s if wall_s else None,
+        **_quantiles(latencies),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regression messages for scenarios worse than baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+        if base.get("p95_s") and result["p95_s"] > base["p95_s"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {result['p95_s'] * 1000:.2f} ms vs baseline {base['p95_s'] * 1000:.2f} ms"
+            )
+        if base.get("throughput_per_s") and result["throughput_per_s"] < base["throughput_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['throughput_per_s']:.1f} items/s vs baseline {base['throughput_per_s']:.1f} items/s"
+            )
+    return regressions
+
+
+def _print_table(results: dict) -> None:
+    print(f"{'scenario':<22}{'items':>8}{'items/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<22}  skipped: {result['skipped']}")
+            continue
+        print(
+            f"{name:<22}{result['items']:>8}{result['throughput_per_s']:>11.1f}"
+            f"{result['p50_s'] * 1000:>10.2f}{result['p95_s'] * 1000:>10.2f}{result['p99_s'] * 1000:>10.2f}"
+            f"{max(result['peak_rss_mb'], result['peak_child_rss_mb']):>9.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the reward functions and compare against a recorded baseline",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Scenarios:\n" + "\n".join(f"  {s.name:<22}{s.description}" for s in SCENARIOS.values()),
+    )
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS),
+                        help='Comma-separated scenarios to run (default: all)')
+    parser.add_argument('--size', type=float, default=1.0,
+                        help='Scale factor for the number of corpus items per scenario (default: 1.0)')
+    parser.add_argument('--mock-latency', type=float, default=0.02,
+                        help='Seconds the mock LLM server waits per request (default: 0.02)')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                        help='Baseline JSON to compare against, if it exists (default: benchmarks/baseline.json)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Allowed relative regression (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--save-baseline', help='Write the results to this file as the new baseline')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    names = [name for name in args.scenarios.replace(" ", "").split(",") if name]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.size <= 0:
+        parser.error("Size must be greater than 0")
+
+    lean_missing = lean_available()
+    results = {}
+    for name in names:
+        if SCENARIOS[name].needs_lean and lean_missing:
+            results[name] = {"skipped": lean_missing}
+            continue
+        print(f"Running {name}...", end="", flush=True)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            results[name] = executor.submit(run_scenario, name, args.size, args.mock_latency).result()
+        print(f" {results[name]['wall_s']:.1f}s")
+
+    print()
+    _print_table(results)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "size": args.size,
+            "mock_latency_s": args.mock_latency,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nSaved baseline to {args.save_baseline}")
+        return 0
+
+    baseline_path = Path(args.baseline)
+    if not baseline_path.exists():
+        print(f"\nNo baseline at {baseline_path}; record one with --save-baseline")
+        return 0
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("meta", {}).get("size") != args.size:
+        print(f"\nWarning: baseline was recorded with --size {baseline.get('meta', {}).get('size')}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%} of {baseline_path}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} of {baseline_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
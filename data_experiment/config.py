@@ -1,4 +1,8 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import re
 
 SYSTEM_PROMPT = """
@@ -16,15 +20,40 @@ Solution: theorem example_1 (x : ℝ) : x^2 - 2*x - 24 < 0 ↔ x ∈ Set.Ioo (-4
 """
 
 
+# Columns of every generated example, in order. system_prompt is the same in every row, so
+# batches hold it dictionary-encoded: one copy of the prompt plus a one-byte index per row.
+SCHEMA = pa.schema([
+    ('user_prompt', pa.string()),
+    ('system_prompt', pa.dictionary(pa.int8(), pa.string())),
+    ('ground_truth', pa.string())
+])
+
+# File metadata key holding the system prompt of files written with system_prompt_in_metadata.
+SYSTEM_PROMPT_METADATA_KEY = b'system_prompt'
+
+# Dataset rows are sampled in blocks of this many rows, block b from its own stream
+# SeedSequence(seed, spawn_key=(b,)). The rows of a seed therefore do not depend on
+# batch sizes or on how generation is split across workers.
+SAMPLE_BLOCK_ROWS = 65536
+
 # Cache the workbook in-memory so we don't re-read it per row.
 _WORKBOOK_DF: pd.DataFrame | None = None
 
 _HERALD_STMT_DF: pd.DataFrame | None = None
 
+# (user prompt, ground truth) source columns as contiguous Arrow arrays, for batch sampling.
+_WORKBOOK_COLUMNS: tuple[pa.Array, pa.Array] | None = None
+
+_HERALD_STMT_COLUMNS: tuple[pa.Array, pa.Array] | None = None
+
 def _strip_header(statement: str) -> str:
     ## strip everything before the first occurance of "theorem"
     return re.sub(r'^.*theorem', 'theorem', statement)
 
+def _strip_header_array(statements: pa.Array) -> pa.Array:
+    ## vectorized _strip_header; RE2 matches Python here ('.' stops at newlines, '^' is the start)
+    return pc.replace_substring_regex(statements, pattern=r'^.*theorem', replacement='theorem', max_replacements=1)
+
 def _get_workbook_df() -> pd.DataFrame:
     global _WORKBOOK_DF
     if _WORKBOOK_DF is None:
@@ -37,12 +66,69 @@ def _get_herald_stmt_df() -> pd.DataFrame:
         _HERALD_STMT_DF = pd.read_parquet("herald_stmt.parquet")
     return _HERALD_STMT_DF
 
-def generate_lean_example_workbook() -> dict:
+def _string_array(values: pd.Series) -> pa.Array:
+    return pa.array(values.astype(str), type=pa.string())
+
+def _get_workbook_columns() -> tuple[pa.Array, pa.Array]:
+    global _WORKBOOK_COLUMNS
+    if _WORKBOOK_COLUMNS is None:
+        df = _get_workbook_df()
+        _WORKBOOK_COLUMNS = (
+            _string_array(df["natural_language_statement"]),
+            _string_array(df["formal_statement"]),
+        )
+    return _WORKBOOK_COLUMNS
+
+def _get_herald_stmt_columns() -> tuple[pa.Array, pa.Array]:
+    global _HERALD_STMT_COLUMNS
+    if _HERALD_STMT_COLUMNS is None:
+        df = _get_herald_stmt_df()
+        # Headers are stripped once for the whole source instead of per sampled row.
+        _HERALD_STMT_COLUMNS = (
+            _string_array(df["informal_statement"]),
+            _strip_header_array(_string_array(df["formal_statement"])),
+        )
+    return _HERALD_STMT_COLUMNS
+
+def block_rng(seed: int, block: int) -> np.random.Generator:
+    '''
+    Independent random stream of one SAMPLE_BLOCK_ROWS block of the dataset for seed.
+    '''
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+
+def dataset_indices(source_rows: int, start: int, count: int, seed: int) -> np.ndarray:
+    '''
+    Source row indices of dataset rows [start, start + count) for seed. Any split of
+    the dataset into ranges concatenates to the same indices.
     '''
-    Generate a single Lean4 auto-formalization training example.
+    parts = []
+    end = start + count
+    for block in range(start // SAMPLE_BLOCK_ROWS, (end - 1) // SAMPLE_BLOCK_ROWS + 1 if count else 0):
+        block_start = block * SAMPLE_BLOCK_ROWS
+        draws = block_rng(seed, block).integers(0, source_rows, size=SAMPLE_BLOCK_ROWS)
+        parts.append(draws[max(start - block_start, 0):min(end - block_start, SAMPLE_BLOCK_ROWS)])
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+def _rng(rng: np.random.Generator | None) -> np.random.Generator:
+    return rng if rng is not None else np.random.default_rng()
+
+def _sample_batch(columns: tuple[pa.Array, pa.Array], indices: np.ndarray) -> pa.RecordBatch:
+    user_prompts, ground_truths = columns
+    system_prompts = pa.DictionaryArray.from_arrays(
+        pa.array(np.zeros(len(indices), dtype=np.int8)), pa.array([SYSTEM_PROMPT.strip()])
+    )
+    return pa.RecordBatch.from_arrays(
+        [user_prompts.take(indices), system_prompts, ground_truths.take(indices)],
+        schema=SCHEMA,
+    )
+
+def generate_lean_example_workbook(rng: np.random.Generator | None = None) -> dict:
+    '''
+    Generate a single Lean4 auto-formalization training example, drawn with rng
+    (default: a freshly seeded generator).
     '''
     df = _get_workbook_df()
-    row = df.sample(n=1).iloc[0]
+    row = df.iloc[int(_rng(rng).integers(len(df)))]
 
     nl_statement = row["natural_language_statement"]
     formal_statement = row["formal_statement"]
@@ -54,12 +140,13 @@ def generate_lean_example_workbook() -> dict:
         "ground_truth": str(formal_statement),
     }
 
-def generate_lean_example_herald_stmt() -> dict:
+def generate_lean_example_herald_stmt(rng: np.random.Generator | None = None) -> dict:
     '''
-    Generate a single Lean4 auto-formalization training example.
+    Generate a single Lean4 auto-formalization training example, drawn with rng
+    (default: a freshly seeded generator).
     '''
     df = _get_herald_stmt_df()
-    row = df.sample(n=1).iloc[0]
+    row = df.iloc[int(_rng(rng).integers(len(df)))]
 
     nl_statement = row["informal_statement"]
     formal_statement = row["formal_statement"]
@@ -70,4 +157,86 @@ def generate_lean_example_herald_stmt() -> dict:
         "ground_truth": _strip_header(str(formal_statement)),
     }
 
+def generate_lean_batch_workbook(batch_size: int, rng: np.random.Generator | None = None) -> pa.RecordBatch:
+    '''
+    Generate batch_size Lean4 auto-formalization training examples at once, sampled
+    with replacement using rng, as a record batch with SCHEMA.
+    '''
+    columns = _get_workbook_columns()
+    return _sample_batch(columns, _rng(rng).integers(0, len(columns[0]), size=batch_size))
+
+def generate_lean_batch_herald_stmt(batch_size: int, rng: np.random.Generator | None = None) -> pa.RecordBatch:
+    '''
+    Generate batch_size Lean4 auto-formalization training examples at once, sampled
+    with replacement using rng, as a record batch with SCHEMA.
+    '''
+    columns = _get_herald_stmt_columns()
+    return _sample_batch(columns, _rng(rng).integers(0, len(columns[0]), size=batch_size))
+
+def generate_lean_rows_workbook(start: int, count: int, seed: int) -> pa.RecordBatch:
+    '''
+    Rows [start, start + count) of the workbook dataset for seed (see SAMPLE_BLOCK_ROWS).
+    Workers generating disjoint ranges produce shards of the single-worker dataset.
+    '''
+    columns = _get_workbook_columns()
+    return _sample_batch(columns, dataset_indices(len(columns[0]), start, count, seed))
+
+def generate_lean_rows_herald_stmt(start: int, count: int, seed: int) -> pa.RecordBatch:
+    '''
+    Rows [start, start + count) of the herald_stmt dataset for seed (see SAMPLE_BLOCK_ROWS).
+    Workers generating disjoint ranges produce shards of the single-worker dataset.
+    '''
+    columns = _get_herald_stmt_columns()
+    return _sample_batch(columns, dataset_indices(len(columns[0]), start, count, seed))
+
+class DatasetWriter:
+    '''
+    Streaming Parquet writer for SCHEMA batches. The constant system_prompt column is
+    written as a one-entry dictionary page plus run-length encoded indices, and reads
+    back as a plain string column. With system_prompt_in_metadata the column is left out
+    and the prompt stored once in the file's key-value metadata; read_dataset restores it.
+    '''
+
+    def __init__(self, where, system_prompt_in_metadata: bool = False):
+        self.system_prompt_in_metadata = system_prompt_in_metadata
+        if system_prompt_in_metadata:
+            schema = SCHEMA.remove(SCHEMA.get_field_index('system_prompt')).with_metadata(
+                {SYSTEM_PROMPT_METADATA_KEY: SYSTEM_PROMPT.strip().encode('utf-8')}
+            )
+            self._writer = pq.ParquetWriter(where, schema)
+        else:
+            # Without the stored Arrow schema, readers see system_prompt as plain strings.
+            self._writer = pq.ParquetWriter(where, SCHEMA, store_schema=False)
+
+    def write_batch(self, batch: pa.RecordBatch, row_group_size: int | None = None):
+        if self.system_prompt_in_metadata:
+            batch = batch.drop_columns(['system_prompt'])
+        self._writer.write_batch(batch, row_group_size=row_group_size)
+
+    def close(self):
+        self._writer.close()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_dataset(path: str, columns: list[str] | None = None) -> pa.Table:
+    '''
+    Read a generated Parquet file or shard directory with plain string columns. A system
+    prompt stored in the file metadata is put back as the system_prompt column.
+    '''
+    prompt = (pq.ParquetDataset(path).schema.metadata or {}).get(SYSTEM_PROMPT_METADATA_KEY)
+    if prompt is None:
+        return pq.read_table(path, columns=columns)
+
+    names = list(columns) if columns is not None else SCHEMA.names
+    table = pq.read_table(path, columns=[name for name in names if name != 'system_prompt'])
+    if 'system_prompt' in names:
+        table = table.add_column(
+            names.index('system_prompt'),
+            'system_prompt',
+            pa.repeat(pa.scalar(prompt.decode('utf-8'), pa.string()), table.num_rows),
+        )
+    return table
@@ -0,0 +1,214 @@
+import json
+import math
+import os
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+import pyarrow as pa
+
+import config
+from config import DatasetWriter
+
+# Rows encoded up front to estimate the parquet bytes per row of a --size target.
+PILOT_ROWS = 100000
+MANIFEST_NAME = "_manifest.json"
+# Top-ups and trims of the last shard before a --size target is given up on.
+MAX_SIZE_PASSES = 10
+
+
+def _rows(source: str, start: int, count: int, seed: int) -> pa.RecordBatch:
+    # Looked up by name, so tasks only pickle a string.
+    return getattr(config, f"generate_lean_rows_{source}")(start, count, seed)
+
+
+def _write_shard(
+    source: str, path: str, start: int, count: int, seed: int, batch_size: int, system_prompt_in_metadata: bool
+) -> tuple[int, int]:
+    '''
+    Write dataset rows [start, start + count) to one parquet file. Returns (rows, bytes).
+    '''
+    with DatasetWriter(path, system_prompt_in_metadata) as writer:
+        for offset in range(0, count, batch_size):
+            writer.write_batch(_rows(source, start + offset, min(batch_size, count - offset), seed))
+    return count, os.path.getsize(path)
+
+
+def _encode_jsonl(source: str, start: int, count: int, seed: int) -> tuple[bytes, np.ndarray]:
+    '''
+    Dataset rows [start, start + count) as JSONL bytes, plus the end offset of each line.
+    '''
+    # json.dumps escapes non-ASCII, so string length equals byte length.
+    lines = [json.dumps(example) + '\n' for example in _rows(source, start, count, seed).to_pylist()]
+    return ''.join(lines).encode('utf-8'), np.cumsum([len(line) for line in lines])
+
+
+def _pool(workers: int, source: str, seed: int) -> Pool:
+    # Load the source in the parent first, so forked workers inherit it instead of re-reading it.
+    _rows(source, 0, 1, seed)
+    return Pool(workers)
+
+
+def estimate_parquet_row_bytes(
+    source: str, seed: int, rows: int = PILOT_ROWS, system_prompt_in_metadata: bool = False
+) -> float:
+    '''
+    Compressed parquet bytes per row, measured by encoding the first rows in memory.
+    '''
+    sink = pa.BufferOutputStream()
+    with DatasetWriter(sink, system_prompt_in_metadata) as writer:
+        writer.write_batch(_rows(source, 0, rows, seed))
+    return sink.getvalue().size / rows
+
+
+def _totals(shards: list[dict]) -> tuple[int, int]:
+    return sum(shard["rows"] for shard in shards), sum(shard["bytes"] for shard in shards)
+
+
+def write_parquet_shards(
+    source: str,
+    output_dir: str,
+    seed: int,
+    workers: int,
+    target_rows: int | None = None,
+    target_size_bytes: int | None = None,
+    batch_size: int = 100000,
+    system_prompt_in_metadata: bool = False,
+    size_tolerance: float = 0.01,
+) -> dict:
+    '''
+    Write the dataset as parquet shards in output_dir, one per worker, each a contiguous
+    row range, and describe them in output_dir/_manifest.json. Read in manifest order
+    (or with pyarrow.parquet.read_table(output_dir)), the shards are the rows a single
+    worker would write.
+
+    With target_rows the row count is exact. With target_size_bytes the row count is
+    estimated from a pilot encode. Then, until the shards add up to within
+    size_tolerance (a fraction of the target) of it, a shortfall is topped up by
+    another shard and an overshoot is trimmed by rewriting the last shard with fewer
+    rows. Each correction uses the bytes per row actually measured.
+
+    With system_prompt_in_metadata the shards store the system prompt once each, in the
+    file metadata; read them with config.read_dataset.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+
+    def write(pool: Pool, tasks: list[tuple[int, int, int]]) -> list[dict]:
+        # tasks are (shard index, start row, rows).
+        results = pool.starmap(
+            _write_shard,
+            [
+                (source, os.path.join(output_dir, f"part-{index:05d}.parquet"), start, count, seed,
+                 batch_size, system_prompt_in_metadata)
+                for index, start, count in tasks
+            ],
+        )
+        return [
+            {"file": f"part-{index:05d}.parquet", "start": start, "rows": count, "bytes": size}
+            for (index, start, _), (count, size) in zip(tasks, results)
+        ]
+
+    with _pool(workers, source, seed) as pool:
+        if target_rows is None:
+            row_bytes = estimate_parquet_row_bytes(
+                source, seed, min(PILOT_ROWS, batch_size), system_prompt_in_metadata
+            )
+            rows = max(math.ceil(target_size_bytes / row_bytes), 1)
+        else:
+            rows = target_rows
+        # Contiguous, near-equal ranges; the first shards take the remainder.
+        counts = [rows // workers + (k < rows % workers) for k in range(workers)]
+        tasks = []
+        for count in counts:
+            if count > 0:
+                tasks.append((len(tasks), sum(t[2] for t in tasks), count))
+        shards.extend(write(pool, tasks))
+
+        if target_size_bytes is not None:
+            slack = target_size_bytes * size_tolerance
+            for _ in range(MAX_SIZE_PASSES):
+                total_rows, total_bytes = _totals(shards)
+                print(f"Progress: {total_bytes / (1024 * 1024):.2f} MB written ({total_rows:,} rows)", end='\r')
+                if abs(total_bytes - target_size_bytes) <= slack:
+                    break
+                if total_bytes < target_size_bytes:
+                    # A small shard compresses worse, so take the larger of the two estimates.
+                    missing = target_size_bytes - total_bytes
+                    rows = max(math.ceil(missing / (total_bytes / total_rows)), 1)
+                    row_bytes = max(
+                        total_bytes / total_rows,
+                        estimate_parquet_row_bytes(source, seed, min(rows, PILOT_ROWS), system_prompt_in_metadata),
+                    )
+                    rows = max(math.ceil(missing / row_bytes), 1)
+                    shards.extend(write(pool, [(len(shards), total_rows, rows)]))
+                else:
+                    last = shards[-1]
+                    excess_rows = math.ceil((total_bytes - target_size_bytes) / (last["bytes"] / last["rows"]))
+                    if excess_rows >= last["rows"] and len(shards) > 1:
+                        os.remove(os.path.join(output_dir, last["file"]))
+                        shards.pop()
+                    else:
+                        keep = max(last["rows"] - excess_rows, 1)
+                        shards[-1] = write(pool, [(len(shards) - 1, last["start"], keep)])[0]
+            total_bytes = _totals(shards)[1]
+            if abs(total_bytes - target_size_bytes) > slack:
+                print(f"\nWarning: {total_bytes:,} bytes is outside the size tolerance after "
+                      f"{MAX_SIZE_PASSES} corrections")
+
+    total_rows, total_bytes = _totals(shards)
+    manifest = {
+        "source": source,
+        "seed": seed,
+        "system_prompt_in_metadata": system_prompt_in_metadata,
+        "rows": total_rows,
+        "bytes": total_bytes,
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_jsonl_ordered(
+    source: str,
+    output_path: str,
+    seed: int,
+    workers: int,
+    target_rows: int | None = None,
+    target_size_bytes: int | None = None,
+    batch_size: int = 10000,
+) -> tuple[int, int]:
+    '''
+    Write one JSONL file, with the JSON encoding spread over workers and the chunks
+    written in order. The file is byte-identical to a single-worker run: it stops after
+    target_rows rows, or after the line that reaches target_size_bytes.
+    Returns (rows, bytes).
+    '''
+    rows = size = 0
+    next_start = 0
+    pending = deque()
+    with _pool(workers, source, seed) as pool, open(output_path, 'wb') as f:
+        while True:
+            # Keep every worker busy with a couple of chunks queued behind it.
+            while len(pending) < 2 * workers and (target_rows is None or next_start < target_rows):
+                count = batch_size if target_rows is None else min(batch_size, target_rows - next_start)
+                pending.append(pool.apply_async(_encode_jsonl, (source, next_start, count, seed)))
+                next_start += count
+            if not pending:
+                break
+            data, ends = pending.popleft().get()
+            if target_size_bytes is not None and size + len(data) >= target_size_bytes:
+                # Cut after the first line that reaches the target.
+                last = int(np.searchsorted(ends, target_size_bytes - size))
+                f.write(data[:ends[last]])
+                rows += last + 1
+                size += int(ends[last])
+                break
+            f.write(data)
+            rows += len(ends)
+            size += len(data)
+            print(f"Progress: {size / (1024 * 1024):.2f} MB written ({rows:,} rows)", end='\r')
+        # Chunks still queued are no longer needed.
+        pool.terminate()
+    return rows, size
@@ -1,16 +1,15 @@
 #https://huggingface.co/datasets/internlm/Lean-Workbook
 
 
-from config import generate_lean_example_workbook
+from config import DatasetWriter, generate_lean_example_workbook, generate_lean_rows_workbook
+from sharded_writer import MANIFEST_NAME, estimate_parquet_row_bytes, write_jsonl_ordered, write_parquet_shards
 
 import argparse
 import json
 import os
-import random
 from typing import Literal
 
-import pyarrow as pa
-import pyarrow.parquet as pq
+import numpy as np
 
 
 def estimate_row_size() -> int:
@@ -21,7 +20,7 @@ def estimate_row_size() -> int:
     return len(json_str.encode('utf-8'))
 
 
-def generate_jsonl(output_path: str, target_size_mb: float, batch_size: int = 10000):
+def generate_jsonl(output_path: str, target_size_mb: float, batch_size: int = 10000, seed: int = 0):
     """Generate a JSONL file up to the target size."""
     target_size_bytes = int(target_size_mb * 1024 * 1024)
     current_size = 0
@@ -33,8 +32,7 @@ def generate_jsonl(output_path: str, target_size_mb: float, batch_size: int = 10
     with open(output_path, 'w') as f:
         while current_size < target_size_bytes:
             # Generate a batch
-            for _ in range(batch_size):
-                example = generate_lean_example_workbook()
+            for example in generate_lean_rows_workbook(row_count, batch_size, seed).to_pylist():
                 line = json.dumps(example) + '\n'
                 line_bytes = line.encode('utf-8')
 
@@ -54,107 +52,189 @@ def generate_jsonl(output_path: str, target_size_mb: float, batch_size: int = 10
     print(f"\nCompleted! Final size: {final_size_mb:.2f} MB ({row_count:,} rows)")
 
 
-def generate_parquet_by_rows(output_path: str, target_rows: int):
+def generate_jsonl_by_rows(output_path: str, target_rows: int, batch_size: int = 10000, seed: int = 0):
+    """Generate a JSONL file with exactly the specified number of rows."""
+    print(f"Generating JSONL file: {output_path}")
+    print(f"Target rows: {target_rows:,}")
+
+    row_count = 0
+    with open(output_path, 'w') as f:
+        while row_count < target_rows:
+            batch = generate_lean_rows_workbook(row_count, min(batch_size, target_rows - row_count), seed)
+            f.writelines(json.dumps(example) + '\n' for example in batch.to_pylist())
+            row_count += batch.num_rows
+            print(f"Progress: {row_count:,} / {target_rows:,} rows", end='\r')
+
+    final_size_kb = os.path.getsize(output_path) / 1024
+    print(f"\nCompleted! Final size: {final_size_kb:.2f} KB ({target_rows:,} rows)")
+
+
+def generate_parquet_by_rows(
+    output_path: str,
+    target_rows: int,
+    batch_size: int = 100000,
+    seed: int = 0,
+    system_prompt_in_metadata: bool = False,
+):
     """Generate a Parquet file with exactly the specified number of rows."""
     print(f"Generating Parquet file: {output_path}")
     print(f"Target rows: {target_rows:,}")
 
-    # Define schema
-    schema = pa.schema([
-        ('user_prompt', pa.string()),
-        ('system_prompt', pa.string()),
-        ('ground_truth', pa.string())
-    ])
-
-    # Generate all examples
-    batch_data = {
-        'user_prompt': [],
-        'system_prompt': [],
-        'ground_truth': []
-    }
-
-    for i in range(target_rows):
-        example = generate_lean_example_workbook()
-        batch_data['user_prompt'].append(example['user_prompt'])
-        batch_data['system_prompt'].append(example['system_prompt'])
-        batch_data['ground_truth'].append(example['ground_truth'])
-
-        if (i + 1) % 1000 == 0:
-            print(f"Progress: {i + 1:,} / {target_rows:,} rows", end='\r')
-
-    # Create Arrow table and write
-    table = pa.table(batch_data, schema=schema)
-    pq.write_table(table, output_path)
+    # Stream batches, so memory stays at one batch however many rows are requested
+    row_count = 0
+    with DatasetWriter(output_path, system_prompt_in_metadata) as writer:
+        while row_count < target_rows:
+            batch = generate_lean_rows_workbook(row_count, min(batch_size, target_rows - row_count), seed)
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+            print(f"Progress: {row_count:,} / {target_rows:,} rows", end='\r')
 
     final_size = os.path.getsize(output_path)
     final_size_kb = final_size / 1024
     print(f"\nCompleted! Final size: {final_size_kb:.2f} KB ({target_rows:,} rows)")
 
 
-def generate_parquet(output_path: str, target_size_mb: float, batch_size: int = 100000):
-    """Generate a Parquet file up to the target size."""
+class CountingFile:
+    """Binary file that counts the bytes written through it, so the size needs no stat calls."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'wb')
+        self.bytes_written = 0
+
+    def write(self, data) -> int:
+        written = self._file.write(data)
+        self.bytes_written += written
+        return written
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+
+# Rows encoded in memory for the bytes per row used to size the first batch.
+SIZE_PILOT_ROWS = 10000
+# Rough Parquet footer size: schema plus per-row-group column chunk metadata.
+FOOTER_BASE_BYTES = 2048
+FOOTER_BYTES_PER_ROW_GROUP = 1024
+
+
+def generate_parquet(
+    output_path: str,
+    target_size_mb: float,
+    batch_size: int = 100000,
+    seed: int = 0,
+    size_tolerance: float = 0.01,
+    system_prompt_in_metadata: bool = False,
+):
+    """
+    Generate a Parquet file of the target size, within size_tolerance (a fraction of
+    the target). Every batch is written as one row group, which the writer flushes as
+    soon as it is complete, so the bytes written so far are exact. Once the target is
+    within a batch, the batch aims at the middle of the tolerance band. Smaller row
+    groups compress worse, so its bytes per row are re-measured with an in-memory encode
+    of that many rows; an undershoot is closed by another, smaller batch.
+    """
     target_size_bytes = int(target_size_mb * 1024 * 1024)
+    # Stop once the estimated final size is within this many bytes below the target.
+    slack = target_size_bytes * size_tolerance
 
     print(f"Generating Parquet file: {output_path}")
     print(f"Target size: {target_size_mb:.2f} MB ({target_size_bytes:,} bytes)")
 
-    # Define schema
-    schema = pa.schema([
-        ('user_prompt', pa.string()),
-        ('system_prompt', pa.string()),
-        ('ground_truth', pa.string())
-    ])
-
     # Use ParquetWriter for streaming writes
-    writer = None
-    current_size = 0
+    sink = CountingFile(output_path)
+    writer = DatasetWriter(sink, system_prompt_in_metadata)
     row_count = 0
+    row_groups = 0
+    row_bytes = estimate_parquet_row_bytes(
+        'workbook', seed, min(SIZE_PILOT_ROWS, batch_size), system_prompt_in_metadata
+    )
 
     try:
-        while current_size < target_size_bytes:
-            # Generate a batch of examples
-            batch_data = {
-                'user_prompt': [],
-                'system_prompt': [],
-                'ground_truth': []
-            }
-
-            for _ in range(batch_size):
-                example = generate_lean_example_workbook()
-                batch_data['user_prompt'].append(example['user_prompt'])
-                batch_data['system_prompt'].append(example['system_prompt'])
-                batch_data['ground_truth'].append(example['ground_truth'])
-
-            # Create Arrow table from batch
-            table = pa.table(batch_data, schema=schema)
-
-            # Initialize writer on first batch
-            if writer is None:
-                writer = pq.ParquetWriter(output_path, schema)
-
-            # Write batch
-            writer.write_table(table)
-            row_count += len(batch_data['user_prompt'])
-
-            # Update current size (approximate)
-            if os.path.exists(output_path):
-                current_size = os.path.getsize(output_path)
+        while True:
+            footer = FOOTER_BASE_BYTES + FOOTER_BYTES_PER_ROW_GROUP * (row_groups + 1)
+            remaining = target_size_bytes - sink.bytes_written - footer
+            if remaining <= slack:
+                break
+
+            # Full batches until the target is close, then just the rows it still needs
+            rows = max(min(batch_size, int((remaining - slack / 2) / row_bytes)), 1)
+            if rows < batch_size:
+                row_bytes = max(
+                    row_bytes, estimate_parquet_row_bytes('workbook', seed, rows, system_prompt_in_metadata)
+                )
+                rows = max(int((remaining - slack / 2) / row_bytes), 1)
+
+            batch = generate_lean_rows_workbook(row_count, rows, seed)
+            writer.write_batch(batch, row_group_size=rows)
+            row_count += batch.num_rows
+            row_groups += 1
+            row_bytes = sink.bytes_written / row_count
 
             # Progress update
-            size_mb = current_size / (1024 * 1024)
+            size_mb = sink.bytes_written / (1024 * 1024)
             print(f"Progress: {size_mb:.2f} MB written ({row_count:,} rows)", end='\r')
 
-            # Break if we've exceeded target size
-            if current_size >= target_size_bytes:
-                break
-
     finally:
-        if writer:
-            writer.close()
-
-    final_size = os.path.getsize(output_path)
-    final_size_mb = final_size / (1024 * 1024)
-    print(f"\nCompleted! Final size: {final_size_mb:.2f} MB ({row_count:,} rows)")
+        writer.close()
+        sink.close()
+
+    final_size_mb = sink.bytes_written / (1024 * 1024)
+    off_by = (sink.bytes_written - target_size_bytes) / target_size_bytes
+    print(f"\nCompleted! Final size: {final_size_mb:.2f} MB ({row_count:,} rows, {off_by:+.2%} of target)")
+
+
+def generate_parallel(
+    output_path: str,
+    format_type: str,
+    workers: int,
+    seed: int,
+    target_rows: int | None = None,
+    target_size_mb: float | None = None,
+    batch_size: int = 100000,
+    system_prompt_in_metadata: bool = False,
+    size_tolerance: float = 0.01,
+):
+    """
+    Generate with a pool of worker processes. JSONL is written as one file, identical
+    to a single-process run; Parquet is written as a directory of one shard per worker
+    plus _manifest.json, which reads back as the same rows. A Parquet size target is
+    met within size_tolerance of the shards' total, by topping up or trimming the last
+    shard.
+    """
+    target_size_bytes = int(target_size_mb * 1024 * 1024) if target_size_mb is not None else None
+    print(f"Generating {format_type} with {workers} workers: {output_path}")
+    if target_rows is not None:
+        print(f"Target rows: {target_rows:,}")
+    else:
+        print(f"Target size: {target_size_mb:.2f} MB ({target_size_bytes:,} bytes)")
+    if format_type == 'parquet' and output_path.endswith('.parquet'):
+        print(f"Warning: {output_path} will be a directory of Parquet shards plus {MANIFEST_NAME}, "
+              f"not a single file; read it with pyarrow.parquet.read_table or config.read_dataset")
+
+    if format_type == 'jsonl':
+        rows, size = write_jsonl_ordered(
+            'workbook', output_path, seed, workers, target_rows, target_size_bytes, batch_size
+        )
+        shards = ""
+    else:
+        manifest = write_parquet_shards(
+            'workbook', output_path, seed, workers, target_rows, target_size_bytes, batch_size,
+            system_prompt_in_metadata, size_tolerance,
+        )
+        rows, size = manifest['rows'], manifest['bytes']
+        shards = f" in {len(manifest['shards'])} shards"
+    off_by = f", {(size - target_size_bytes) / target_size_bytes:+.2%} of target" if target_size_bytes else ""
+    print(f"\nCompleted! Final size: {size / (1024 * 1024):.2f} MB ({rows:,} rows{shards}{off_by})")
 
 
 def main():
@@ -171,6 +251,12 @@ Examples:
 
   # Generate a 500MB file (auto-detect format from extension)
   python parquet_generator.py base_conversion_500mb.parquet --size 500
+
+  # Generate a 2GB Parquet dataset as 8 shards on 8 cores
+  python parquet_generator.py base_conversion_2gb.parquet --size 2048 --workers 8
+
+  # Store the system prompt once in the file metadata (read with config.read_dataset)
+  python parquet_generator.py data_1m.parquet --rows 1000000 --system-prompt-in-metadata
         """
     )
 
@@ -203,18 +289,40 @@ Examples:
         help='Batch size for writing (default: 10000 for JSONL, 100000 for Parquet)'
     )
 
+    parser.add_argument(
+        '--size-tolerance',
+        type=float,
+        default=0.01,
+        help='Allowed deviation from --size for Parquet output, as a fraction (default: 0.01); '
+             'with --workers it applies to the shards\' total'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Worker processes (default: 1). With more than one, Parquet output becomes a '
+             'directory of shards plus _manifest.json; JSONL output stays a single file'
+    )
+
+    parser.add_argument(
+        '--system-prompt-in-metadata',
+        action='store_true',
+        help='Parquet only: store the system prompt once in the file metadata instead of as a '
+             'column; config.read_dataset restores the column'
+    )
+
     parser.add_argument(
         '--seed',
         type=int,
-        help='Random seed for reproducibility'
+        help='Random seed for reproducibility (default: a random seed, printed)'
     )
 
     args = parser.parse_args()
 
-    # Set random seed if provided
-    if args.seed is not None:
-        random.seed(args.seed)
-        print(f"Using random seed: {args.seed}")
+    # The same seed always yields the same rows, whatever the batch size
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    print(f"Using random seed: {seed}")
 
     # Determine format
     format_type = args.format
@@ -233,16 +341,38 @@ Examples:
     if args.size is not None and args.rows is not None:
         parser.error("Cannot specify both --size and --rows")
 
+    if args.workers <= 0:
+        parser.error("Workers must be greater than 0")
+    if not 0 < args.size_tolerance < 1:
+        parser.error("Size tolerance must be between 0 and 1")
+    if args.system_prompt_in_metadata and format_type != 'parquet':
+        parser.error("--system-prompt-in-metadata only applies to Parquet output")
+
     # Generate file
     try:
-        if args.rows is not None:
+        if args.workers > 1:
+            if args.rows is not None and args.rows <= 0:
+                parser.error("Rows must be greater than 0")
+            if args.size is not None and args.size <= 0:
+                parser.error("Size must be greater than 0")
+            batch_size = args.batch_size or (10000 if format_type == 'jsonl' else 100000)
+            generate_parallel(
+                args.output, format_type, args.workers, seed,
+                target_rows=args.rows, target_size_mb=args.size, batch_size=batch_size,
+                system_prompt_in_metadata=args.system_prompt_in_metadata, size_tolerance=args.size_tolerance,
+            )
+        elif args.rows is not None:
             # Row-based generation
             if args.rows <= 0:
                 parser.error("Rows must be greater than 0")
+            batch_size = args.batch_size or (10000 if format_type == 'jsonl' else 100000)
             if format_type == 'jsonl':
-                generate_jsonl_by_rows(args.output, args.rows)
+                generate_jsonl_by_rows(args.output, args.rows, batch_size, seed=seed)
             else:
-                generate_parquet_by_rows(args.output, args.rows)
+                generate_parquet_by_rows(
+                    args.output, args.rows, batch_size, seed=seed,
+                    system_prompt_in_metadata=args.system_prompt_in_metadata,
+                )
         else:
             # Size-based generation
             if args.size <= 0:
@@ -255,9 +385,12 @@ Examples:
                 batch_size = 10000 if format_type == 'jsonl' else 100000
 
             if format_type == 'jsonl':
-                generate_jsonl(args.output, args.size, batch_size)
+                generate_jsonl(args.output, args.size, batch_size, seed=seed)
             else:
-                generate_parquet(args.output, args.size, batch_size)
+                generate_parquet(
+                    args.output, args.size, batch_size, seed=seed, size_tolerance=args.size_tolerance,
+                    system_prompt_in_metadata=args.system_prompt_in_metadata,
+                )
     except KeyboardInterrupt:
         print("\n\nGeneration interrupted by user")
         if os.path.exists(args.output):
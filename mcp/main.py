@@ -1,4 +1,11 @@
 import logging
+import sys
+from pathlib import Path
+
+# Run as `python mcp/main.py`: make the repo's reward_fn package importable. Appended,
+# not prepended, so this mcp/ directory never shadows the installed `mcp` package.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from server import mcp
 from tools import *
 
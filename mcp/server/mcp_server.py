@@ -4,6 +4,8 @@ from starlette.responses import PlainTextResponse
 
 import logging
 
+from reward_fn.instrumentation import render_prometheus
+
 logger = logging.getLogger(__name__)
 
 mcp = FastMCP("OsmosisTools")
@@ -13,3 +15,9 @@ async def health_check(request: Request) -> PlainTextResponse:
     return PlainTextResponse("OK")
 
 
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    # Empty unless REWARD_METRICS=1; tools record through reward_fn.instrumentation.
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
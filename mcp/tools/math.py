@@ -1,7 +1,9 @@
 from typing import Any
 from server import mcp
+from reward_fn.instrumentation import instrumented
 
 @mcp.tool()
+@instrumented()
 def multiply(first_val: float, second_val: float) -> float:
     '''
     Calculate the product of two numbers
@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of Lean verification results.
+
+Keys are a SHA-256 of the normalized proof text plus the Lean toolchain and Mathlib
+revision of lean_env/, so results never leak across toolchain upgrades. Results live in
+an in-memory LRU and, optionally, in a SQLite file that survives restarts and can be
+shared by several trainer processes on the same machine.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+LEAN_ENV_DIR = Path(__file__).parent.parent / "lean_env"
+
+# Maximum in-memory entries; 0 disables caching entirely.
+CACHE_SIZE = int(os.getenv("LEAN_REWARD_CACHE_SIZE", "100000"))
+# Optional SQLite file for the on-disk tier.
+CACHE_DB = os.getenv("LEAN_REWARD_CACHE_DB")
+
+
+def lean_env_version(lean_env_dir: Path = LEAN_ENV_DIR) -> str:
+    """Identify the toolchain and Mathlib revision a verification result depends on."""
+    parts = []
+    try:
+        parts.append((lean_env_dir / "lean-toolchain").read_text().strip())
+    except OSError:
+        parts.append("unknown-toolchain")
+    try:
+        manifest = json.loads((lean_env_dir / "lake-manifest.json").read_text())
+        for package in manifest.get("packages", []):
+            if package.get("name", "").lower() == "mathlib":
+                parts.append(f"mathlib@{package.get('rev')}")
+    except (OSError, ValueError):
+        parts.append("unknown-mathlib")
+    return "|".join(parts)
+
+
+def normalize_proof(solution_str: str) -> str:
+    """
+    Canonical form used for cache keys: unified line endings, no trailing whitespace.
+    Indentation is kept because Lean tactic blocks are whitespace-sensitive.
+    """
+    lines = solution_str.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+
+
+class VerificationCache:
+    """
+    Two-tier (memory LRU, optional SQLite) cache of (reward, reason) per proof.
+    Thread-safe. Also tracks how much Lean time the hits saved.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_SIZE,
+        db_path: str | None = CACHE_DB,
+        version: str | None = None,
+    ):
+        self.max_entries = max_entries
+        self.version = version if version is not None else lean_env_version()
+        self._entries: OrderedDict[str, tuple[float, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            # WAL lets several trainer processes read and write the same file.
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lean_results ("
+                "key TEXT PRIMARY KEY, reward REAL, reason TEXT, lean_seconds REAL, created REAL)"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lean_seconds_saved = 0.0
+
+    def key(self, solution_str: str, kind: str = "proof") -> str:
+        """kind separates checks of different strictness, e.g. "proof" and "statement"."""
+        payload = f"{self.version}\0{kind}\0{normalize_proof(solution_str)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, solution_str: str, kind: str = "proof") -> tuple[float, str] | None:
+        key = self.key(solution_str, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self.lean_seconds_saved += entry[2]
+                return entry[0], entry[1]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT reward, reason, lean_seconds FROM lean_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, (row[0], row[1], row[2]))
+                    self.disk_hits += 1
+                    self.lean_seconds_saved += row[2]
+                    return row[0], row[1]
+            self.misses += 1
+            return None
+
+    def put(
+        self, solution_str: str, reward: float, reason: str, lean_seconds: float, kind: str = "proof"
+    ) -> None:
+        key = self.key(solution_str, kind)
+        with self._lock:
+            self._remember(key, (reward, reason, lean_seconds))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO lean_results VALUES (?, ?, ?, ?, ?)",
+                    (key, reward, reason, lean_seconds, time.time()),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[float, str, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "lean_seconds_saved": self.lean_seconds_saved,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM lean_results")
+                self._db.commit()
+
+
+_DEFAULT_CACHE: VerificationCache | None = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_default_cache() -> VerificationCache | None:
+    """Shared cache used by lean_reward, or None when LEAN_REWARD_CACHE_SIZE is 0."""
+    global _DEFAULT_CACHE
+    if CACHE_SIZE <= 0:
+        return None
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = VerificationCache()
+        return _DEFAULT_CACHE
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the shared cache (empty when caching is disabled)."""
+    cache = get_default_cache()
+    return cache.stats() if cache is not None else {}
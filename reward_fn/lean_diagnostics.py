@@ -0,0 +1,195 @@
+"""
+Structured Lean diagnostics and the shaped rewards computed from them.
+
+Lean reports messages as JSON, one object per line with `lean --json`, or inside
+each REPL response:
+    {"severity": "error", "pos": {"line": 3, "column": 2},
+     "endPos": {"line": 3, "column": 7}, "data": "unsolved goals\\n⊢ 1 + 1 = 2"}
+Both are parsed into Diagnostic records. Plain-text output (`file:3:2: error: ...`),
+e.g. from older tools or from the verification cache, is parsed as a fallback.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+
+from reward_fn.lean_prefilter import strip_comments_and_strings
+
+# How lean_proof_reward turns diagnostics into a reward: "binary", "statement" or "goals".
+REWARD_MODE = os.getenv("LEAN_REWARD_MODE", "binary")
+# Reward for a proof whose statement elaborates but whose proof fails.
+STATEMENT_CREDIT = float(os.getenv("LEAN_REWARD_STATEMENT_CREDIT", "0.5"))
+
+_TEXT_MESSAGE_RE = re.compile(r"^(?:.*?:)?(\d+):(\d+): (error|warning|information|info): ?(.*)$")
+_DECLARATION_RE = re.compile(r"(?<![\w.'])(theorem|lemma)(?![\w'])")
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    severity: str
+    # 1-based line and 0-based column, as Lean reports them; 0:0 for messages that do
+    # not come from Lean (timeouts, pre-filter rejections).
+    line: int
+    column: int
+    message: str
+    end_line: int | None = None
+    end_column: int | None = None
+
+    @property
+    def is_error(self) -> bool:
+        return self.severity == "error"
+
+    @property
+    def goal_count(self) -> int:
+        """Goals left open by an `unsolved goals` error."""
+        if not self.message.startswith("unsolved goals"):
+            return 0
+        return self.message.count("⊢")
+
+    def __str__(self) -> str:
+        return f"{self.line}:{self.column}: {self.severity}: {self.message}"
+
+
+class LeanDiagnostics(list):
+    """
+    The Diagnostic records of one check. str() gives the human-readable reason,
+    e.g. "Proof is valid." or the rendered Lean messages.
+    """
+
+    def __init__(self, items=(), text: str | None = None):
+        super().__init__(items)
+        self.text = text
+
+    @property
+    def errors(self) -> list[Diagnostic]:
+        return [d for d in self if d.is_error]
+
+    @property
+    def goal_count(self) -> int:
+        return sum(d.goal_count for d in self)
+
+    def __str__(self) -> str:
+        if self.text is not None:
+            return self.text
+        return "\n".join(str(d) for d in self)
+
+    def __repr__(self) -> str:
+        return f"LeanDiagnostics({list.__repr__(self)})"
+
+
+def from_message(msg: dict) -> Diagnostic:
+    """Convert one Lean JSON message (CLI or REPL) into a Diagnostic."""
+    pos = msg.get("pos") or {}
+    end = msg.get("endPos") or {}
+    severity = msg.get("severity", "error")
+    return Diagnostic(
+        severity="information" if severity == "info" else severity,
+        line=pos.get("line", 0),
+        column=pos.get("column", 0),
+        message=msg.get("data", ""),
+        end_line=end.get("line"),
+        end_column=end.get("column"),
+    )
+
+
+def parse_repl_messages(messages: list[dict]) -> LeanDiagnostics:
+    return LeanDiagnostics(from_message(m) for m in messages)
+
+
+def parse_text(text: str) -> LeanDiagnostics:
+    """
+    Parse `[file:]line:col: severity: message` output. Lines that do not start a new
+    message continue the previous one; output with no such line at all becomes a single
+    error diagnostic at 0:0.
+    """
+    items = []
+    for line in text.splitlines():
+        match = _TEXT_MESSAGE_RE.match(line)
+        if match is not None:
+            severity = "information" if match.group(3) == "info" else match.group(3)
+            items.append([severity, int(match.group(1)), int(match.group(2)), match.group(4)])
+        elif items:
+            items[-1][3] += "\n" + line
+    if not items and text.strip():
+        return LeanDiagnostics([Diagnostic("error", 0, 0, text.strip())])
+    return LeanDiagnostics(Diagnostic(*item) for item in items)
+
+
+def parse_lean_output(stdout: str, stderr: str) -> LeanDiagnostics:
+    """
+    Parse the output of `lean --json`: JSON messages on stdout, anything else
+    (lake errors, panics) as text.
+    """
+    items = []
+    text_lines = []
+    for line in (stdout or "").splitlines():
+        if line.startswith("{"):
+            try:
+                items.append(from_message(json.loads(line)))
+                continue
+            except (json.JSONDecodeError, AttributeError):
+                pass
+        text_lines.append(line)
+    text_lines.extend((stderr or "").splitlines())
+    items.extend(parse_text("\n".join(text_lines)))
+    return LeanDiagnostics(items)
+
+
+def message(reason: str) -> LeanDiagnostics:
+    """Diagnostics for an outcome that is not a Lean message (timeout, pre-filter...)."""
+    return LeanDiagnostics([Diagnostic("error", 0, 0, reason)], text=reason)
+
+
+def proof_start_offset(source: str) -> int | None:
+    """
+    Index of the `:=` that starts the proof of the first theorem or lemma in source,
+    or None if it cannot be found.
+    """
+    code = strip_comments_and_strings(source)
+    match = _DECLARATION_RE.search(code)
+    if match is None:
+        return None
+    depth = 0
+    for i in range(match.end(), len(code) - 1):
+        ch = code[i]
+        if ch in "([{⟨⦃":
+            depth += 1
+        elif ch in ")]}⟩⦄":
+            depth -= 1
+        elif depth == 0 and ch == ":" and code[i + 1] == "=":
+            return i
+    return None
+
+
+def proof_start(source: str) -> tuple[int, int] | None:
+    """The same position as (1-based line, 0-based column), as Lean reports positions."""
+    i = proof_start_offset(source)
+    if i is None:
+        return None
+    return source.count("\n", 0, i) + 1, i - (source.rfind("\n", 0, i) + 1)
+
+
+def shaped_reward(
+    reward: float,
+    diagnostics: LeanDiagnostics,
+    solution_str: str,
+    mode: str = REWARD_MODE,
+) -> float:
+    """
+    Partial credit computed from a failed check's diagnostics, at no extra Lean cost.
+        binary:    the kernel verdict, 1.0 or 0.0
+        statement: STATEMENT_CREDIT when every error lies inside the proof, i.e. the
+                   theorem statement itself elaborated
+        goals:     like statement, plus up to the remaining (1 - STATEMENT_CREDIT)
+                   when the only errors are unsolved goals, shrinking as more remain
+    """
+    if reward >= 1.0 or mode == "binary":
+        return reward
+    errors = diagnostics.errors
+    start = proof_start(solution_str)
+    if not errors or start is None or any((e.line, e.column) < start for e in errors):
+        return 0.0
+    if mode == "goals" and all(e.goal_count for e in errors):
+        return STATEMENT_CREDIT + (1.0 - STATEMENT_CREDIT) / (1 + diagnostics.goal_count)
+    return STATEMENT_CREDIT
@@ -0,0 +1,305 @@
+"""
+Per-check resource limits and accounting for Lean processes.
+
+run_lean_process starts Lean in its own process group with CPU-time and address-space
+rlimits (or a cgroup-v2 memory limit, when a delegated cgroup is configured), enforces
+the wall-clock limit, and reports the wall time, CPU time and peak RSS the check used.
+"""
+
+import os
+import resource
+import select
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+def _env_number(name: str, default: str | None) -> float | None:
+    value = os.getenv(name, default)
+    return float(value) if value not in (None, "", "0") else None
+
+
+# Lean's maxHeartbeats when nothing sets it.
+LEAN_DEFAULT_MAX_HEARTBEATS = 200000
+
+
+@dataclass(frozen=True)
+class LeanLimits:
+    """Limits applied to one Lean check. None disables a limit."""
+
+    wall_seconds: float = 30.0
+    cpu_seconds: float | None = None
+    memory_mb: float | None = None
+    # Lean's own deterministic timeout (None: LEAN_DEFAULT_MAX_HEARTBEATS).
+    max_heartbeats: int | None = None
+
+    @classmethod
+    def from_env(cls) -> "LeanLimits":
+        heartbeats = _env_number("LEAN_REWARD_MAX_HEARTBEATS", None)
+        return cls(
+            wall_seconds=_env_number("LEAN_REWARD_WALL_TIMEOUT_S", "30") or 30.0,
+            cpu_seconds=_env_number("LEAN_REWARD_CPU_LIMIT_S", None),
+            memory_mb=_env_number("LEAN_REWARD_MEMORY_LIMIT_MB", None),
+            max_heartbeats=int(heartbeats) if heartbeats else None,
+        )
+
+
+DEFAULT_LIMITS = LeanLimits.from_env()
+# Delegated cgroup-v2 directory; each check then gets its own child cgroup with
+# memory.max set, which also accounts for page cache and is more precise than RLIMIT_AS.
+CGROUP_ROOT = os.getenv("LEAN_REWARD_CGROUP_ROOT")
+
+
+@dataclass
+class LeanCheckResult:
+    """Outcome of one verification together with what it cost."""
+
+    reward: float
+    reason: str
+    # False for outcomes that say nothing about the proof (timeouts, infrastructure
+    # errors); those are never cached.
+    definitive: bool = True
+    # "prefilter", "cache", "pool" or "process".
+    source: str = "process"
+    wall_time_s: float = 0.0
+    cpu_time_s: float | None = None
+    peak_rss_mb: float | None = None
+    timed_out: bool = False
+    # lean_diagnostics.LeanDiagnostics of the check.
+    diagnostics: list = field(default_factory=list)
+
+
+@dataclass
+class LeanProcessRun:
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool
+    cancelled: bool
+    wall_time_s: float
+    cpu_time_s: float
+    peak_rss_mb: float
+
+
+def _apply_limits(pid: int, limits: LeanLimits, cgroup: Path | None) -> None:
+    """
+    Apply limits to a just-started child from the parent. Done right after spawn, while
+    lake is still loading its workspace, so the lean process it starts inherits them.
+    A preexec_fn would do it before exec, but is unsafe in the threads checks run in.
+    """
+    try:
+        if cgroup is not None:
+            (cgroup / "cgroup.procs").write_text(str(pid))
+        elif limits.memory_mb is not None:
+            limit = int(limits.memory_mb * 1024 * 1024)
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if limits.cpu_seconds is not None:
+            soft = int(limits.cpu_seconds) or 1
+            resource.prlimit(pid, resource.RLIMIT_CPU, (soft, soft + 1))
+    except ProcessLookupError:
+        # Already exited; wait4 reports how.
+        pass
+
+
+def _make_cgroup(limits: LeanLimits) -> Path | None:
+    if not CGROUP_ROOT or limits.memory_mb is None:
+        return None
+    try:
+        cgroup = Path(CGROUP_ROOT) / f"lean-{uuid.uuid4().hex[:12]}"
+        cgroup.mkdir()
+        (cgroup / "memory.max").write_text(str(int(limits.memory_mb * 1024 * 1024)))
+        (cgroup / "memory.swap.max").write_text("0")
+        return cgroup
+    except OSError:
+        return None
+
+
+def _remove_cgroup(cgroup: Path) -> float | None:
+    """Remove a per-check cgroup, returning its memory.peak in MB if the kernel has it."""
+    peak = None
+    try:
+        peak = int((cgroup / "memory.peak").read_text()) / (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    try:
+        cgroup.rmdir()
+    except OSError:
+        pass
+    return peak
+
+
+def _read_pipe(stream, chunks: list[bytes]) -> None:
+    chunks.append(stream.read())
+    stream.close()
+
+
+def _write_pipe(stream, data: bytes) -> None:
+    try:
+        stream.write(data)
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            stream.close()
+        except BrokenPipeError:
+            pass
+
+
+def kill_process_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_lean_process(
+    argv: list[str],
+    cwd: Path,
+    limits: LeanLimits = DEFAULT_LIMITS,
+    input_text: str | None = None,
+    cancel: threading.Event | None = None,
+) -> LeanProcessRun:
+    """
+    Run argv (e.g. `lake env lean ...`) under limits and measure it.
+    The whole process group is killed on timeout or when cancel is set. CPU time and
+    peak RSS come from wait4() on the child, which covers the lean process lake waits for.
+    A killed lean is never waited for by lake, so its usage is read from /proc just
+    before the kill instead.
+    """
+    cgroup = _make_cgroup(limits)
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        argv,
+        cwd=cwd,
+        stdin=subprocess.PIPE if input_text is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    _apply_limits(proc.pid, limits, cgroup)
+    stdout_chunks: list[bytes] = []
+    stderr_chunks: list[bytes] = []
+    readers = [
+        threading.Thread(target=_read_pipe, args=(proc.stdout, stdout_chunks), daemon=True),
+        threading.Thread(target=_read_pipe, args=(proc.stderr, stderr_chunks), daemon=True),
+    ]
+    if input_text is not None:
+        # Written from a thread too, so a child that never reads cannot block the deadline.
+        readers.append(threading.Thread(
+            target=_write_pipe, args=(proc.stdin, input_text.encode("utf-8")), daemon=True
+        ))
+    for reader in readers:
+        reader.start()
+
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        pidfd = None
+    deadline = start + limits.wall_seconds
+    timed_out = cancelled = False
+    killed_usage = (0.0, 0.0)
+    try:
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+            elif time.perf_counter() >= deadline:
+                timed_out = True
+            if timed_out or cancelled:
+                killed_usage = process_tree_usage(proc.pid)
+                kill_process_group(proc.pid)
+                _, status, usage = os.wait4(proc.pid, 0)
+                break
+            wait = deadline - time.perf_counter()
+            if cancel is not None:
+                wait = min(wait, 0.05)
+            if pidfd is not None:
+                select.select([pidfd], [], [], max(wait, 0))
+            else:
+                time.sleep(min(max(wait, 0), 0.01))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+    # Lean may have left grandchildren holding the pipes open.
+    kill_process_group(proc.pid)
+    wall_time = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+
+    cpu_time = max(usage.ru_utime + usage.ru_stime, killed_usage[0])
+    peak_rss_mb = max(usage.ru_maxrss / 1024, killed_usage[1])
+    if cgroup is not None:
+        peak_rss_mb = _remove_cgroup(cgroup) or peak_rss_mb
+    return LeanProcessRun(
+        returncode=proc.returncode,
+        stdout=b"".join(stdout_chunks).decode("utf-8", errors="replace"),
+        stderr=b"".join(stderr_chunks).decode("utf-8", errors="replace"),
+        timed_out=timed_out,
+        cancelled=cancelled,
+        wall_time_s=wall_time,
+        cpu_time_s=cpu_time,
+        peak_rss_mb=peak_rss_mb,
+    )
+
+
+def process_tree_pids(pid: int) -> list[int]:
+    """pid followed by all of its live descendants (Linux only)."""
+    pids = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return pids
+
+
+def process_tree_usage(pid: int) -> tuple[float, float]:
+    """
+    (CPU seconds, peak RSS in MB) consumed so far by pid and its descendants.
+    Used to account checks done by long-lived REPL workers (Linux only).
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = 0.0
+    peak_kb = 0
+    for current in process_tree_pids(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                # Fields after the ")" closing the command name; utime and stime are 14 and 15.
+                fields = f.read().rsplit(")", 1)[1].split()
+                cpu += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpu, peak_kb / 1024
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """
+    Reset the peak RSS (VmHWM) of pid and its descendants to their current RSS, so that
+    process_tree_usage then reports the peak since this call (Linux 4.0+).
+    Returns False if some process could not be reset.
+    """
+    reset = True
+    for current in process_tree_pids(pid):
+        try:
+            with open(f"/proc/{current}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            reset = False
+    return reset
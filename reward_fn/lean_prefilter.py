@@ -0,0 +1,185 @@
+"""
+Cheap lexical checks that reject a submission before Lean is invoked.
+
+Each rule looks at the submission with comments, string and char literals removed and returns
+a short detail string when the submission fails it. A rejection is reported as
+    "prefilter:<rule>: <detail>"
+so callers can tell pre-filter rejections apart from Lean errors.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable
+
+# Submissions longer than this many characters are rejected outright.
+MAX_CHARS = int(os.getenv("LEAN_REWARD_MAX_PROOF_CHARS", "100000"))
+# Words that make a proof worthless as a reward signal.
+FORBIDDEN_TOKENS = tuple(
+    token
+    for token in os.getenv("LEAN_REWARD_FORBIDDEN_TOKENS", "sorry,admit,axiom").replace(" ", "").split(",")
+    if token
+)
+
+_BRACKETS = {")": "(", "]": "[", "}": "{", "⟩": "⟨", "⦄": "⦃"}
+# A whole char literal such as 'a', '(' or '\n'. A quote right after a name character is
+# part of the name (h', foo'), not a literal.
+CHAR_LITERAL_PATTERN = r"(?<![\w.'])'(?:\\(?:x[0-9a-fA-F]{2}|u\{[0-9a-fA-F]+\}|.)|[^'\\\n])'"
+# Comment and string starts, or a char literal.
+_SPECIAL_RE = re.compile(r'--|/-|"|' + CHAR_LITERAL_PATTERN)
+_DECLARATION_RE = re.compile(r"(?<![\w.'])(theorem|lemma)(?![\w'])")
+_FORBIDDEN_RE = re.compile(
+    r"(?<![\w.'])(" + "|".join(re.escape(token) for token in FORBIDDEN_TOKENS) + r")(?![\w'])"
+) if FORBIDDEN_TOKENS else None
+
+
+def strip_comments_and_strings(source: str) -> str:
+    """
+    Replace comments (`--`, nested `/- -/`), string and char literals with spaces.
+    Newlines are kept so line numbers stay valid.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    while i < n:
+        special = _SPECIAL_RE.search(source, i)
+        if special is None:
+            out.append(source[i:])
+            break
+        out.append(source[i:special.start()])
+        i = special.start()
+        if source[i] == "'":
+            end = special.end()
+        elif source.startswith("--", i):
+            end = source.find("\n", i)
+            end = n if end == -1 else end
+        elif source.startswith("/-", i):
+            depth = 0
+            end = i
+            while end < n:
+                if source.startswith("/-", end):
+                    depth += 1
+                    end += 2
+                elif source.startswith("-/", end):
+                    depth -= 1
+                    end += 2
+                    if depth == 0:
+                        break
+                else:
+                    end += 1
+        else:
+            end = i + 1
+            while end < n and source[end] != '"':
+                end += 2 if source[end] == "\\" else 1
+            end = min(end + 1, n)
+        out.append(re.sub(r"[^\n]", " ", source[i:end]))
+        i = end
+    return "".join(out)
+
+
+def _check_empty(source: str, code: str) -> str | None:
+    if not code.strip():
+        return "submission is empty"
+    return None
+
+
+def _check_size(source: str, code: str) -> str | None:
+    if len(source) > MAX_CHARS:
+        return f"{len(source)} characters exceeds the {MAX_CHARS} limit"
+    return None
+
+
+def _check_theorem(source: str, code: str) -> str | None:
+    if _DECLARATION_RE.search(code) is None:
+        return "no theorem or lemma declaration"
+    return None
+
+
+def _check_brackets(source: str, code: str) -> str | None:
+    stack = []
+    for line_no, line in enumerate(code.split("\n"), start=1):
+        for ch in line:
+            if ch in "([{⟨⦃":
+                stack.append((ch, line_no))
+            elif ch in _BRACKETS:
+                if not stack or stack[-1][0] != _BRACKETS[ch]:
+                    return f"unexpected '{ch}' at line {line_no}"
+                stack.pop()
+    if stack:
+        ch, line_no = stack[-1]
+        return f"unclosed '{ch}' from line {line_no}"
+    return None
+
+
+def _check_single_declaration(source: str, code: str) -> str | None:
+    count = len(_DECLARATION_RE.findall(code))
+    if count > 1:
+        return f"{count} theorem/lemma declarations, expected one"
+    return None
+
+
+def _check_forbidden(source: str, code: str) -> str | None:
+    match = _FORBIDDEN_RE.search(code) if _FORBIDDEN_RE is not None else None
+    if match is not None:
+        line_no = code.count("\n", 0, match.start()) + 1
+        return f"'{match.group(1)}' at line {line_no}"
+    return None
+
+
+# Rules in the order they run; the cheap ones first.
+RULES: dict[str, Callable[[str, str], str | None]] = {
+    "size": _check_size,
+    "empty": _check_empty,
+    "no_theorem": _check_theorem,
+    "unbalanced_brackets": _check_brackets,
+    "forbidden_token": _check_forbidden,
+    "single_declaration": _check_single_declaration,
+}
+# Rules applied to proofs by lean_reward; LEAN_REWARD_PREFILTER_RULES="" disables the pre-filter.
+DEFAULT_RULES = tuple(
+    name
+    for name in os.getenv(
+        "LEAN_REWARD_PREFILTER_RULES", "size,empty,no_theorem,unbalanced_brackets,forbidden_token"
+    ).replace(" ", "").split(",")
+    if name
+)
+_unknown_rules = [name for name in DEFAULT_RULES if name not in RULES]
+if _unknown_rules:
+    raise ValueError(
+        f"LEAN_REWARD_PREFILTER_RULES names unknown rules {', '.join(_unknown_rules)}; "
+        f"available rules: {', '.join(RULES)}"
+    )
+# Rules for `theorem ... := sorry` statements: sorry is expected, one declaration each.
+STATEMENT_RULES = ("size", "empty", "no_theorem", "unbalanced_brackets", "single_declaration")
+
+_STATS: Counter = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def prefilter(solution_str: str, rules: tuple[str, ...] | None = None) -> str | None:
+    """
+    Run the lexical rules on solution_str.
+    Returns None if it may be a valid proof, otherwise a reason such as
+    "prefilter:forbidden_token: 'sorry' at line 3".
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    if not rules:
+        return None
+    # The size rule runs first so huge inputs are never scanned.
+    code = solution_str if len(solution_str) > MAX_CHARS else strip_comments_and_strings(solution_str)
+    for name in rules:
+        detail = RULES[name](solution_str, code)
+        if detail is not None:
+            with _STATS_LOCK:
+                _STATS[name] += 1
+            return f"prefilter:{name}: {detail}"
+    with _STATS_LOCK:
+        _STATS["passed"] += 1
+    return None
+
+
+def prefilter_stats() -> dict[str, int]:
+    """How many submissions each rule short-circuited, plus how many passed."""
+    with _STATS_LOCK:
+        return dict(_STATS)
@@ -0,0 +1,689 @@
+"""
+Warm Lean REPL workers for reward_fn.lean_reward.
+
+Each worker is a long-lived Lean REPL process (leanprover-community/repl, run via
+`lake exe repl` inside lean_env/) that has already elaborated a warm header such as
+`import Mathlib`. A check then only pays for elaborating the submission itself.
+
+The REPL speaks JSON over stdin/stdout: a command such as
+    {"cmd": "theorem foo : 1 + 1 = 2 := rfl", "env": 0}
+is answered with
+    {"env": 1, "messages": [{"severity": "error", "pos": {...}, "data": "..."}]}
+followed by a blank line.
+"""
+
+import atexit
+import json
+import os
+import re
+import select
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from reward_fn.lean_diagnostics import LeanDiagnostics, message, parse_repl_messages
+from reward_fn.lean_limits import (
+    DEFAULT_LIMITS,
+    LEAN_DEFAULT_MAX_HEARTBEATS,
+    LeanCheckResult,
+    LeanLimits,
+    process_tree_pids,
+    process_tree_usage,
+    reset_peak_rss,
+)
+
+LEAN_ENV_DIR = Path(__file__).parent.parent / "lean_env"
+
+# Number of warm workers; 0 disables the pool and every check spawns `lake env lean`.
+POOL_SIZE = int(os.getenv("LEAN_REWARD_POOL_SIZE", "4"))
+# Recycle a worker after this many checks, or once its resident memory exceeds the limit.
+WORKER_MAX_CHECKS = int(os.getenv("LEAN_REWARD_WORKER_MAX_CHECKS", "500"))
+WORKER_MAX_RSS_MB = int(os.getenv("LEAN_REWARD_WORKER_MAX_RSS_MB", "8192"))
+# Longest a check queues for an idle worker before it runs on a fresh `lake env lean`
+# instead; its wall limit only starts once it has a worker.
+POOL_WAIT_S = float(os.getenv("LEAN_REWARD_POOL_WAIT_S", "10"))
+# Header every worker elaborates once at startup.
+WARM_HEADER = os.getenv("LEAN_REWARD_WARM_HEADER", "import Mathlib")
+# Loading Mathlib from .olean files takes a while on a cold page cache.
+WARM_HEADER_TIMEOUT = 600
+REPL_COMMAND = shlex.split(os.getenv("LEAN_REWARD_REPL_CMD", "lake exe repl"))
+# How often a waiting check looks at its cancel event.
+CANCEL_POLL_INTERVAL = 0.05
+# How often a running check measures its worker's memory and CPU time.
+RESOURCE_POLL_INTERVAL = 0.2
+
+_IMPORT_RE = re.compile(r"\s*import\s+([^\s]+)")
+_TOKEN_RE = re.compile(r"\S+")
+_NAME_RE = re.compile(r"[A-Za-z_\u00c0-\uffff«][\w.'!?\u00c0-\uffff«»]*")
+_SET_OPTION_VALUE_RE = re.compile(r"true|false|\d+|\"[^\"]*\"")
+# Words that start a new command, so they can never be a namespace after `open`.
+_COMMAND_KEYWORDS = frozenset({
+    "abbrev", "attribute", "axiom", "class", "def", "end", "example", "hiding", "import",
+    "in", "inductive", "instance", "lemma", "local", "macro", "mutual", "namespace",
+    "noncomputable", "notation", "opaque", "open", "private", "protected", "renaming",
+    "scoped", "section", "set_option", "structure", "syntax", "theorem", "universe",
+    "variable",
+})
+
+
+class LeanReplError(RuntimeError):
+    """The REPL process died, timed out or answered with something unexpected."""
+
+
+class LeanReplStartupError(LeanReplError):
+    """A worker could not be started, e.g. the REPL is not built in lean_env."""
+
+
+class CheckCancelled(Exception):
+    """The caller set the cancel event while a check was running."""
+
+
+class WorkerLimitExceeded(Exception):
+    """A worker went over the memory or CPU limit of its check and has to be killed."""
+
+
+def split_imports(source: str) -> tuple[list[str], str]:
+    """
+    Split the leading `import` commands off a Lean source string.
+    Returns (module_names, rest) where rest has the imports blanked out with whitespace
+    of the same shape, so Lean still reports positions relative to the original text.
+    """
+    modules = []
+    pos = 0
+    while True:
+        match = _IMPORT_RE.match(source, pos)
+        if match is None:
+            break
+        modules.append(match.group(1))
+        pos = match.end()
+    return modules, _blank(source[:pos]) + source[pos:]
+
+
+def _blank(text: str) -> str:
+    """Replace every character except newlines with a space."""
+    return re.sub(r"[^\n]", " ", text)
+
+
+class SplitSubmission(NamedTuple):
+    """A submission cut into its shared preamble and the part that is actually checked."""
+
+    imports: list[str]
+    # `open ...` / `set_option ...` commands after the imports, one per line ("" if none).
+    header: str
+    # Source with imports and header blanked out.
+    body: str
+    # Source with only the imports blanked out, used when the header fails to elaborate.
+    without_imports: str
+
+
+def split_header(source: str) -> SplitSubmission:
+    """
+    Split a submission such as
+        import Mathlib open scoped ENNReal open Real theorem foo ... := ...
+    into its imports, its header commands and the remaining body.
+    Scoped forms (`open Foo in`, `set_option ... in`), `hiding`/`renaming` and anything
+    else unusual end the header early, so they stay part of the body.
+    """
+    imports, rest = split_imports(source)
+    tokens = [(m.group(), m.end()) for m in _TOKEN_RE.finditer(rest)]
+    commands = []
+    header_end = 0
+    i = 0
+    while i < len(tokens):
+        word = tokens[i][0]
+        if word == "open":
+            j = i + 1
+            if j < len(tokens) and tokens[j][0] == "scoped":
+                j += 1
+            k = j
+            while k < len(tokens) and _is_name(tokens[k][0]):
+                k += 1
+            if k == j or (k < len(tokens) and (tokens[k][0] in ("in", "hiding", "renaming") or tokens[k][0].startswith("("))):
+                break
+        elif word == "set_option":
+            k = i + 3
+            if (
+                k > len(tokens)
+                or not _is_name(tokens[i + 1][0])
+                or not (_SET_OPTION_VALUE_RE.fullmatch(tokens[i + 2][0]) or _is_name(tokens[i + 2][0]))
+                or (k < len(tokens) and tokens[k][0] == "in")
+            ):
+                break
+        else:
+            break
+        commands.append(" ".join(token for token, _ in tokens[i:k]))
+        header_end = tokens[k - 1][1]
+        i = k
+    body = _blank(rest[:header_end]) + rest[header_end:]
+    return SplitSubmission(imports, "\n".join(commands), body, rest)
+
+
+def _is_heartbeat_timeout(reason: str) -> bool:
+    """Lean's deterministic timeout depends on the configured limit, not just the proof."""
+    return "maximum number of heartbeats" in reason
+
+
+def _is_name(token: str) -> bool:
+    return token not in _COMMAND_KEYWORDS and _NAME_RE.fullmatch(token) is not None
+
+
+def _process_tree_rss_mb(pid: int) -> float:
+    """Resident memory of pid and all of its descendants, in MB (Linux only)."""
+    total_kb = 0
+    for current in process_tree_pids(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class LeanReplWorker:
+    """
+    One REPL process with the warm header already elaborated.
+    Not thread-safe: the pool hands each worker to a single caller at a time.
+    """
+
+    def __init__(self, lean_env_dir: Path = LEAN_ENV_DIR, header: str = WARM_HEADER):
+        self.checks = 0
+        self.header_hits = 0
+        self.header_misses = 0
+        # Normalized header text -> REPL environment id with that header elaborated.
+        self._header_envs: dict[str, int] = {}
+        self.proc = subprocess.Popen(
+            REPL_COMMAND,
+            cwd=lean_env_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            # Own process group, so close() also kills the repl binary lake spawns.
+            start_new_session=True,
+        )
+        self._buffer = b""
+        try:
+            response = self.send({"cmd": header}, timeout=WARM_HEADER_TIMEOUT)
+            errors = [m for m in response.get("messages", []) if m.get("severity") == "error"]
+            if errors or "env" not in response:
+                raise LeanReplError(f"Warm header failed: {parse_repl_messages(errors) or response}")
+            self.base_env = response["env"]
+        except BaseException:
+            self.close()
+            raise
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def rss_mb(self) -> float:
+        return _process_tree_rss_mb(self.proc.pid)
+
+    def send(
+        self,
+        payload: dict,
+        timeout: float,
+        cancel: threading.Event | None = None,
+        watch: Callable[[], None] | None = None,
+    ) -> dict:
+        """
+        Send one JSON command and wait up to timeout seconds for its response.
+        Raises CheckCancelled as soon as cancel is set; the worker must then be closed,
+        since the REPL is still busy with the command. watch, if given, is called every
+        RESOURCE_POLL_INTERVAL seconds while waiting and may raise to abort the command
+        the same way.
+        """
+        if not self.alive():
+            raise LeanReplError(f"Lean REPL exited with code {self.proc.returncode}.")
+        try:
+            self.proc.stdin.write(json.dumps(payload).encode("utf-8") + b"\n\n")
+            self.proc.stdin.flush()
+        except OSError as e:
+            raise LeanReplError(f"Lean REPL stdin closed: {e}") from e
+
+        deadline = time.monotonic() + timeout
+        next_watch = time.monotonic() + RESOURCE_POLL_INTERVAL
+        fd = self.proc.stdout.fileno()
+        while b"\n\n" not in self._buffer:
+            if cancel is not None and cancel.is_set():
+                raise CheckCancelled
+            now = time.monotonic()
+            if watch is not None and now >= next_watch:
+                watch()
+                next_watch = now + RESOURCE_POLL_INTERVAL
+            remaining = deadline - now
+            if remaining <= 0:
+                raise TimeoutError
+            if cancel is not None:
+                remaining = min(remaining, CANCEL_POLL_INTERVAL)
+            if watch is not None:
+                remaining = min(remaining, max(next_watch - now, 0))
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                raise LeanReplError(f"Lean REPL exited with code {self.proc.poll()}.")
+            self._buffer += chunk
+
+        raw, self._buffer = self._buffer.split(b"\n\n", 1)
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise LeanReplError(f"Malformed REPL response: {raw[:200]!r}") from e
+
+    def header_env(
+        self,
+        header: str,
+        timeout: float,
+        cancel: threading.Event | None = None,
+        watch: Callable[[], None] | None = None,
+    ) -> int | None:
+        """
+        Environment with header elaborated on top of the warm imports.
+        Each distinct header is elaborated once per worker and its snapshot reused.
+        Returns None when the header itself does not elaborate.
+        """
+        if not header:
+            return self.base_env
+        if header in self._header_envs:
+            self.header_hits += 1
+            return self._header_envs[header]
+        self.header_misses += 1
+        response = self.send({"cmd": header, "env": self.base_env}, timeout=timeout, cancel=cancel, watch=watch)
+        if "env" not in response or any(m.get("severity") == "error" for m in response.get("messages", [])):
+            return None
+        self._header_envs[header] = response["env"]
+        return response["env"]
+
+    def check(
+        self,
+        submission: SplitSubmission,
+        timeout: float,
+        cancel: threading.Event | None = None,
+        watch: Callable[[], None] | None = None,
+    ) -> tuple[float, LeanDiagnostics]:
+        """
+        Elaborate a submission's body against its pre-elaborated header.
+        A header that fails to elaborate is checked together with the body instead,
+        so Lean reports its errors as usual.
+        Returns (reward, diagnostics).
+        """
+        self.checks += 1
+        deadline = time.monotonic() + timeout
+        env = self.header_env(submission.header, timeout, cancel=cancel, watch=watch)
+        source = submission.body
+        if env is None:
+            env, source = self.base_env, submission.without_imports
+        remaining = max(deadline - time.monotonic(), 0.001)
+        response = self.send({"cmd": source, "env": env}, timeout=remaining, cancel=cancel, watch=watch)
+        if "messages" not in response and "message" in response:
+            # REPL-level failure (e.g. unknown environment), not a verdict on the proof.
+            raise LeanReplError(str(response["message"]))
+        diagnostics = parse_repl_messages(response.get("messages", []))
+        if diagnostics.errors:
+            return 0.0, diagnostics
+        diagnostics.text = "Proof is valid."
+        return 1.0, diagnostics
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class LeanWorkerPool:
+    """
+    Fixed-size pool of warm LeanReplWorkers.
+    Workers start lazily on first use (or all at once with prewarm()) in background
+    threads, since loading the warm header can take minutes; callers only wait for
+    an idle worker, up to max_wait_s seconds or until their cancel event is set, and
+    otherwise leave the check to a fresh `lake env lean` run. Workers are recycled
+    after max_checks checks, once their memory grows past max_rss_mb, or when a
+    check times out. During a check, a worker whose process tree goes over max_rss_mb
+    (or the check's own memory or CPU limit) is killed right away.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        header: str = WARM_HEADER,
+        max_checks: int = WORKER_MAX_CHECKS,
+        max_rss_mb: float = WORKER_MAX_RSS_MB,
+        lean_env_dir: Path = LEAN_ENV_DIR,
+        max_heartbeats: int | None = DEFAULT_LIMITS.max_heartbeats,
+        max_wait_s: float = POOL_WAIT_S,
+    ):
+        self.size = size
+        self.max_wait_s = max_wait_s
+        self.header = header
+        self.max_heartbeats = max_heartbeats
+        if max_heartbeats is not None:
+            # Part of every worker's base environment, so it applies to each check.
+            self.header += f"\nset_option maxHeartbeats {max_heartbeats}"
+        self.max_checks = max_checks
+        self.max_rss_mb = max_rss_mb
+        self.lean_env_dir = lean_env_dir
+        self.header_imports = set(split_imports(header)[0])
+        self._idle: list[LeanReplWorker] = []
+        self._started = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        # Why the last worker failed to start; cleared once one starts or it is reported.
+        self._startup_error: LeanReplStartupError | None = None
+        self.header_hits = 0
+        self.header_misses = 0
+
+    def prewarm(self) -> None:
+        """Start every worker now, off the request path, instead of on first use."""
+        with self._cond:
+            while self._started < self.size and not self._closed:
+                self._spawn()
+
+    def _spawn(self) -> None:
+        """Start one worker in a background thread. Called with _cond held."""
+        self._started += 1
+        threading.Thread(target=self._start_worker, name="lean-repl-start", daemon=True).start()
+
+    def _start_worker(self) -> None:
+        try:
+            worker = LeanReplWorker(self.lean_env_dir, self.header)
+        except Exception as e:
+            with self._cond:
+                self._started -= 1
+                self._startup_error = LeanReplStartupError(f"Could not start Lean REPL worker: {e!r}")
+                self._cond.notify_all()
+            return
+        with self._cond:
+            if not self._closed:
+                self._startup_error = None
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._started -= 1
+        worker.close()
+
+    def _acquire(self, cancel: threading.Event | None = None, deadline: float | None = None) -> LeanReplWorker:
+        """
+        An idle worker, starting a new one if the pool is not full yet.
+        Raises TimeoutError once time.monotonic() passes deadline, CheckCancelled when
+        cancel is set, and LeanReplStartupError when workers fail to start.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise LeanReplError("Lean worker pool is closed.")
+                if cancel is not None and cancel.is_set():
+                    raise CheckCancelled
+                if self._idle:
+                    return self._idle.pop()
+                if self._startup_error is not None and self._started == 0:
+                    # Nothing is running or starting, so nothing will become idle.
+                    # Reported once; the next call tries starting workers again.
+                    error, self._startup_error = self._startup_error, None
+                    raise error
+                if self._started < self.size:
+                    self._spawn()
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        raise TimeoutError
+                if cancel is not None:
+                    wait = CANCEL_POLL_INTERVAL if wait is None else min(wait, CANCEL_POLL_INTERVAL)
+                self._cond.wait(wait)
+
+    def _release(self, worker: LeanReplWorker, healthy: bool) -> None:
+        recycle = (
+            not healthy
+            or not worker.alive()
+            or worker.checks >= self.max_checks
+            or worker.rss_mb() > self.max_rss_mb
+        )
+        if recycle:
+            worker.close()
+        with self._cond:
+            if recycle or self._closed:
+                if not recycle:
+                    worker.close()
+                self._started -= 1
+            else:
+                self._idle.append(worker)
+            self._cond.notify()
+
+    def _with_heartbeats(self, submission: SplitSubmission, limits: LeanLimits) -> SplitSubmission:
+        """submission with the check's maxHeartbeats, when it differs from the workers' base environment."""
+        if limits.max_heartbeats == self.max_heartbeats:
+            return submission
+        option = f"set_option maxHeartbeats {limits.max_heartbeats or LEAN_DEFAULT_MAX_HEARTBEATS}"
+        # Before the submission's own header, so a set_option there still wins as with `lean -D`.
+        return submission._replace(header=f"{option}\n{submission.header}".strip())
+
+    def _watch(
+        self, worker: LeanReplWorker, limits: LeanLimits, cpu_before: float
+    ) -> tuple[Callable[[], None], bool]:
+        """
+        Start accounting a check on worker, whose CPU time so far is cpu_before.
+        Returns the watch function that enforces the memory and CPU limits while the
+        check runs, and whether the worker's peak RSS could be reset, i.e. whether
+        process_tree_usage will report this check's own peak.
+        """
+        memory_mb = self.max_rss_mb if limits.memory_mb is None else min(self.max_rss_mb, limits.memory_mb)
+        peak_reset = reset_peak_rss(worker.proc.pid)
+
+        def watch() -> None:
+            cpu, peak_rss_mb = process_tree_usage(worker.proc.pid)
+            rss_mb = peak_rss_mb if peak_reset else worker.rss_mb()
+            if rss_mb > memory_mb:
+                raise WorkerLimitExceeded(f"Lean ran out of memory: worker exceeded {memory_mb:g} MB.")
+            if limits.cpu_seconds is not None and cpu - cpu_before > limits.cpu_seconds:
+                raise WorkerLimitExceeded(f"Lean exceeded the CPU time limit ({limits.cpu_seconds:g}s).")
+
+        return watch, peak_reset
+
+    def check(
+        self,
+        solution_str: str,
+        timeout: float,
+        cancel: threading.Event | None = None,
+        limits: LeanLimits = DEFAULT_LIMITS,
+    ) -> LeanCheckResult | None:
+        """
+        Verify solution_str on an idle warm worker and account what it cost.
+        timeout is the wall limit; limits supplies the memory, CPU and heartbeat limits,
+        which are enforced on the worker while it checks. A worker that exceeds them is
+        killed and the check gets a non-definitive result.
+        CPU time is the worker's CPU delta; peak RSS is the worker's high-water mark
+        over this check (its warm imports included), or None where it cannot be reset.
+        The wall limit starts once a worker is acquired, so time spent queueing for one
+        never counts against the check. Raises TimeoutError if the check itself takes
+        longer than timeout seconds, and CheckCancelled if cancel is set first; a worker
+        that was already checking is then killed.
+        Returns None when the submission's imports differ from the warm header's, or
+        when no worker became idle within max_wait_s seconds; the caller should then
+        fall back to a fresh `lake env lean` run.
+        """
+        submission = split_header(solution_str)
+        # Exactly the warm imports: a source importing less (or nothing) would see
+        # declarations the cold path does not give it, and pass here but fail there.
+        if set(submission.imports) != self.header_imports:
+            return None
+        submission = self._with_heartbeats(submission, limits)
+
+        try:
+            worker = self._acquire(cancel, time.monotonic() + self.max_wait_s)
+        except TimeoutError:
+            return None
+        deadline = time.monotonic() + timeout
+        healthy = False
+        hits, misses = worker.header_hits, worker.header_misses
+        cpu_before, _ = process_tree_usage(worker.proc.pid)
+        watch, peak_reset = self._watch(worker, limits, cpu_before)
+        start = time.perf_counter()
+        try:
+            remaining = max(deadline - time.monotonic(), 0.001)
+            try:
+                reward, diagnostics = worker.check(submission, timeout=remaining, cancel=cancel, watch=watch)
+            except WorkerLimitExceeded as e:
+                reward, diagnostics = 0.0, message(str(e))
+            else:
+                healthy = True
+            cpu_after, peak_rss_mb = process_tree_usage(worker.proc.pid)
+            reason = str(diagnostics)
+            return LeanCheckResult(
+                reward,
+                reason,
+                definitive=healthy and not _is_heartbeat_timeout(reason),
+                source="pool",
+                wall_time_s=time.perf_counter() - start,
+                cpu_time_s=cpu_after - cpu_before,
+                peak_rss_mb=peak_rss_mb if peak_reset else None,
+                diagnostics=diagnostics,
+            )
+        finally:
+            with self._cond:
+                self.header_hits += worker.header_hits - hits
+                self.header_misses += worker.header_misses - misses
+            # A timed-out, crashed or over-limit worker is unhealthy and gets replaced.
+            self._release(worker, healthy)
+
+    def check_statements(
+        self,
+        statements: list[str],
+        timeout: float,
+        cancel: threading.Event | None = None,
+        limits: LeanLimits = DEFAULT_LIMITS,
+    ) -> list[LeanCheckResult | None]:
+        """
+        Elaborate many statements in turn on a single warm worker, one REPL command
+        each against the shared header environment, so no statement sees another's
+        declarations and the worker is acquired only once.
+        timeout applies per statement, and so do the memory, CPU and heartbeat limits
+        of limits; a statement that exceeds them gets a non-definitive result and the
+        rest continue on a fresh worker. Entries are None for statements whose imports
+        differ from the warm header's, whose worker crashed, that were left when no
+        worker became idle within max_wait_s seconds, or that were reached after the
+        pool was closed; the caller should check those with a fresh `lake env lean` run.
+        Raises LeanReplStartupError when no worker can be started.
+        """
+        results: list[LeanCheckResult | None] = [None] * len(statements)
+        pending = [
+            (i, self._with_heartbeats(submission, limits))
+            for i, submission in enumerate(map(split_header, statements))
+            if set(submission.imports) == self.header_imports
+        ]
+        timeout_reason = f"Lean verification timed out ({timeout:g}s)."
+        worker = None
+        try:
+            for i, submission in pending:
+                if worker is None:
+                    try:
+                        worker = self._acquire(cancel, time.monotonic() + self.max_wait_s)
+                    except LeanReplStartupError:
+                        raise
+                    except (TimeoutError, LeanReplError):
+                        # The pool is saturated or was closed: the rest are left to a
+                        # fresh `lake env lean` run.
+                        break
+                    hits, misses = worker.header_hits, worker.header_misses
+                start = time.perf_counter()
+                watch, _ = self._watch(worker, limits, process_tree_usage(worker.proc.pid)[0])
+                try:
+                    remaining = max(timeout - (time.perf_counter() - start), 0.001)
+                    reward, diagnostics = worker.check(submission, timeout=remaining, cancel=cancel, watch=watch)
+                except (TimeoutError, LeanReplError, WorkerLimitExceeded) as e:
+                    with self._cond:
+                        self.header_hits += worker.header_hits - hits
+                        self.header_misses += worker.header_misses - misses
+                    self._release(worker, healthy=False)
+                    worker = None
+                    if isinstance(e, TimeoutError):
+                        results[i] = LeanCheckResult(
+                            0.0, timeout_reason, definitive=False, source="pool", wall_time_s=timeout,
+                            timed_out=True, diagnostics=message(timeout_reason),
+                        )
+                    elif isinstance(e, WorkerLimitExceeded):
+                        results[i] = LeanCheckResult(
+                            0.0, str(e), definitive=False, source="pool",
+                            wall_time_s=time.perf_counter() - start, diagnostics=message(str(e)),
+                        )
+                    continue
+                if reward >= 1.0:
+                    diagnostics.text = "Statement elaborates."
+                reason = str(diagnostics)
+                results[i] = LeanCheckResult(
+                    reward,
+                    reason,
+                    definitive=not _is_heartbeat_timeout(reason),
+                    source="pool",
+                    wall_time_s=time.perf_counter() - start,
+                    diagnostics=diagnostics,
+                )
+                if worker.checks >= self.max_checks:
+                    self._release(worker, healthy=True)
+                    worker = None
+        finally:
+            if worker is not None:
+                with self._cond:
+                    self.header_hits += worker.header_hits - hits
+                    self.header_misses += worker.header_misses - misses
+                # Still busy if we got here through CheckCancelled, so not reusable then.
+                self._release(worker, healthy=not (cancel is not None and cancel.is_set()))
+        return results
+
+    def stats(self) -> dict:
+        """Worker counts and how often a pre-elaborated header could be reused."""
+        with self._cond:
+            return {
+                "workers": self._started,
+                "idle_workers": len(self._idle),
+                "header_hits": self.header_hits,
+                "header_misses": self.header_misses,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+
+
+_DEFAULT_POOL: LeanWorkerPool | None = None
+_DEFAULT_POOL_DISABLED = False
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def get_default_pool() -> LeanWorkerPool | None:
+    """Shared pool used by lean_reward, or None when the pool is disabled."""
+    global _DEFAULT_POOL
+    if POOL_SIZE <= 0 or _DEFAULT_POOL_DISABLED or not LEAN_ENV_DIR.exists():
+        return None
+    with _DEFAULT_POOL_LOCK:
+        if _DEFAULT_POOL is None:
+            _DEFAULT_POOL = LeanWorkerPool()
+            atexit.register(_DEFAULT_POOL.close)
+        return _DEFAULT_POOL
+
+
+def disable_default_pool() -> None:
+    """Stop routing checks through the pool, e.g. when the REPL is not installed."""
+    global _DEFAULT_POOL_DISABLED
+    _DEFAULT_POOL_DISABLED = True
+    if _DEFAULT_POOL is not None:
+        _DEFAULT_POOL.close()
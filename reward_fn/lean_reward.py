@@ -1,67 +1,203 @@
+import asyncio
 import os
-import tempfile
-import subprocess
+import threading
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from itertools import chain, zip_longest
 from pathlib import Path
+from typing import Hashable
 from osmosis_ai import osmosis_reward
 
+from reward_fn.lean_cache import get_default_cache
+from reward_fn.lean_diagnostics import (
+    LeanDiagnostics,
+    message,
+    parse_lean_output,
+    parse_text,
+    proof_start_offset,
+    shaped_reward,
+)
+from reward_fn.instrumentation import instrumented, record_event
+from reward_fn.lean_limits import DEFAULT_LIMITS, LeanCheckResult, LeanLimits, run_lean_process
+from reward_fn.lean_prefilter import STATEMENT_RULES, prefilter
+from reward_fn.lean_repl import (
+    CheckCancelled,
+    LeanReplError,
+    LeanReplStartupError,
+    disable_default_pool,
+    get_default_pool,
+    split_header,
+)
+
+LEAN_ENV_DIR = Path(__file__).parent.parent / "lean_env"
+
+# Default concurrency for lean_proof_reward_batch: one Lean process per core.
+BATCH_MAX_WORKERS = int(os.getenv("LEAN_REWARD_BATCH_WORKERS", str(os.cpu_count() or 1)))
+# Maximum Lean checks the async API runs at once per event loop; further calls wait.
+ASYNC_MAX_CONCURRENCY = int(os.getenv("LEAN_REWARD_ASYNC_CONCURRENCY", str(os.cpu_count() or 1)))
+
+
+@instrumented()
+def lean_verify(
+    solution_str: str,
+    limits: LeanLimits | None = None,
+    cancel: threading.Event | None = None,
+) -> LeanCheckResult:
+    """
+    Run Lean kernel check on solution_str and report what it cost.
+
+    Submissions that fail the lexical pre-filter are rejected without running Lean,
+    and results are served from the verification cache when the same proof was checked
+    before against the same toolchain. Otherwise the check runs under limits
+    (default: DEFAULT_LIMITS, configured through LEAN_REWARD_* environment variables).
+    Raises CheckCancelled if cancel is set while Lean is running.
+    """
+    result = _lean_fast_path(solution_str)
+    if result is None:
+        result = _lean_check(solution_str, limits or DEFAULT_LIMITS, cancel)
+        _lean_remember(solution_str, result)
+    _record_outcome("lean_verify", result)
+    return result
+
+
+def _record_outcome(name: str, result: LeanCheckResult) -> None:
+    """Count where a check was answered (prefilter, cache, pool, process) and timeouts."""
+    record_event(name, result.source)
+    if result.timed_out:
+        record_event(name, "timeout")
+
 
 def _lean_verify_with_reason(solution_str: str) -> tuple[float, str]:
     """
     Run Lean kernel check on solution_str.
     Returns (reward, reason): (1.0, success_msg) or (0.0, failure_output).
     """
-    try:
-        reward_fn_dir = Path(__file__).parent
-        project_root = reward_fn_dir.parent
-        lean_env_dir = project_root / "lean_env"
+    result = lean_verify(solution_str)
+    return result.reward, result.reason
 
-        if not lean_env_dir.exists():
-            return 0.0, f"Lean environment not found at {lean_env_dir}"
 
-        with tempfile.NamedTemporaryFile(
-            mode='w',
-            suffix='.lean',
-            dir=lean_env_dir,
-            delete=False
-        ) as temp_file:
-            temp_file.write(solution_str)
-            temp_file_path = temp_file.name
+def _lean_fast_path(
+    solution_str: str, rules: tuple[str, ...] | None = None, kind: str = "proof"
+) -> LeanCheckResult | None:
+    """Answer from the pre-filter or the cache, or None if Lean has to run."""
+    rejection = prefilter(solution_str, rules)
+    if rejection is not None:
+        return LeanCheckResult(0.0, rejection, source="prefilter", diagnostics=message(rejection))
 
+    cache = get_default_cache()
+    if cache is not None:
+        cached = cache.get(solution_str, kind)
+        if cached is not None:
+            reward, reason = cached
+            diagnostics = LeanDiagnostics(text=reason) if reward >= 1.0 else parse_text(reason)
+            diagnostics.text = reason
+            return LeanCheckResult(reward, reason, source="cache", diagnostics=diagnostics)
+    return None
+
+
+def _lean_remember(solution_str: str, result: LeanCheckResult, kind: str = "proof") -> None:
+    cache = get_default_cache()
+    if cache is not None and result.definitive:
+        cache.put(solution_str, result.reward, result.reason, result.wall_time_s, kind)
+
+
+def _lean_check(
+    solution_str: str,
+    limits: LeanLimits,
+    cancel: threading.Event | None = None,
+) -> LeanCheckResult:
+    """
+    Uncached Lean check. result.definitive is False for outcomes that say nothing
+    about the proof itself (timeouts, exhausted limits, missing lean_env,
+    infrastructure errors); those are never cached.
+
+    Checks go to a warm Lean REPL worker when the pool is enabled and the proof only
+    imports what the workers preload; otherwise a fresh `lake env lean` is spawned.
+    """
+    timeout_reason = f"Lean verification timed out ({limits.wall_seconds:g}s)."
+    pool = get_default_pool()
+    if pool is not None:
         try:
-            result = subprocess.run(
-                ['lake', 'env', 'lean', temp_file_path],
-                cwd=lean_env_dir,
-                capture_output=True,
-                text=True,
-                timeout=30
+            result = pool.check(solution_str, timeout=limits.wall_seconds, cancel=cancel, limits=limits)
+            if result is not None:
+                return result
+        except TimeoutError:
+            return LeanCheckResult(
+                0.0, timeout_reason, definitive=False, source="pool",
+                wall_time_s=limits.wall_seconds, timed_out=True, diagnostics=message(timeout_reason),
             )
+        except LeanReplStartupError:
+            # REPL not built in lean_env: stop trying it for the rest of the process.
+            disable_default_pool()
+        except LeanReplError:
+            # A worker crashed mid-check; it has been recycled, so re-check cold below.
+            pass
 
-            if result.returncode == 0:
-                stderr_lower = (result.stderr or "").lower()
-                if 'error' not in stderr_lower or len((result.stderr or "").strip()) == 0:
-                    return 1.0, "Proof is valid."
+    try:
+        lean_env_dir = LEAN_ENV_DIR
+        if not lean_env_dir.exists():
+            reason = f"Lean environment not found at {lean_env_dir}"
+            return LeanCheckResult(0.0, reason, definitive=False, diagnostics=message(reason))
 
-            # Failure: prefer stderr, then stdout, then returncode
-            out = (result.stderr or "").strip() or (result.stdout or "").strip()
-            if not out:
-                out = f"Lean exited with code {result.returncode} (no output)."
-            return 0.0, out
+        # The source goes through stdin, so verification never writes into lean_env/.
+        # --json makes Lean print one structured message per line on stdout.
+        argv = ['lake', 'env', 'lean', '--stdin', '--json']
+        if limits.max_heartbeats is not None:
+            argv.append(f'-DmaxHeartbeats={limits.max_heartbeats}')
+        run = run_lean_process(argv, lean_env_dir, limits, input_text=solution_str, cancel=cancel)
+    except Exception as e:
+        reason = f"Error verifying proof: {e}"
+        return LeanCheckResult(0.0, reason, definitive=False, diagnostics=message(reason))
 
-        finally:
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+    if run.cancelled:
+        raise CheckCancelled
+    if run.timed_out:
+        reward, diagnostics, definitive = 0.0, message(timeout_reason), False
+    else:
+        reward, diagnostics, definitive = _interpret_lean_output(run.returncode, run.stdout, run.stderr)
+    return LeanCheckResult(
+        reward,
+        str(diagnostics),
+        definitive=definitive,
+        source="process",
+        wall_time_s=run.wall_time_s,
+        cpu_time_s=run.cpu_time_s,
+        peak_rss_mb=run.peak_rss_mb,
+        timed_out=run.timed_out,
+        diagnostics=diagnostics,
+    )
 
-    except subprocess.TimeoutExpired:
-        return 0.0, "Lean verification timed out (30s)."
-    except Exception as e:
-        return 0.0, f"Error verifying proof: {e}"
+
+def _interpret_lean_output(returncode: int, stdout: str, stderr: str) -> tuple[float, LeanDiagnostics, bool]:
+    """
+    Turn a finished `lake env lean --json` run into (reward, diagnostics, definitive).
+    The proof is valid when Lean exits cleanly without error-severity messages; warnings
+    (and identifiers that merely contain "error") do not count.
+    """
+    diagnostics = parse_lean_output(stdout, stderr)
+    if returncode == 0 and not diagnostics.errors:
+        diagnostics.text = "Proof is valid."
+        return 1.0, diagnostics, True
+
+    if not diagnostics:
+        diagnostics = message(f"Lean exited with code {returncode} (no output).")
+    out = str(diagnostics)
+    # A negative code means Lean was killed by a signal (e.g. SIGXCPU), and running out
+    # of heartbeats or memory depends on the limits; none of them is a verdict on the proof.
+    exhausted = "maximum number of heartbeats" in out or "out of memory" in out.lower()
+    return 0.0, diagnostics, returncode >= 0 and not exhausted
 
 
+@instrumented()
 @osmosis_reward
 def lean_proof_reward(solution_str: str, ground_truth: str = None):
     """
     Reward function for Lean 4 proofs.
     Returns 1.0 if the proof passes the Lean kernel check, 0.0 otherwise.
+    With LEAN_REWARD_MODE=statement or goals, failed proofs whose statement elaborates
+    get partial credit (see lean_diagnostics.shaped_reward).
 
     Args:
         solution_str: String containing the Lean proof code
@@ -70,14 +206,365 @@ def lean_proof_reward(solution_str: str, ground_truth: str = None):
     Returns:
         float: 1.0 if proof is valid, 0.0 otherwise
     """
-    reward, _ = _lean_verify_with_reason(solution_str)
-    return reward
+    result = lean_verify(solution_str)
+    return shaped_reward(result.reward, result.diagnostics, solution_str)
+
+
+def lean_proof_reward_with_reason(
+    solution_str: str, ground_truth: str = None
+) -> tuple[float, LeanDiagnostics]:
+    """
+    Same as lean_proof_reward but also returns the structured diagnostics, so callers
+    can see why it failed. Each Diagnostic has severity, line, column, message and
+    goal_count; str(diagnostics) is e.g. "Proof is valid." on success, or the rendered
+    Lean messages on failure.
+    """
+    result = lean_verify(solution_str)
+    return shaped_reward(result.reward, result.diagnostics, solution_str), result.diagnostics
 
 
-def lean_proof_reward_with_reason(solution_str: str, ground_truth: str = None) -> tuple[float, str]:
+@instrumented()
+def lean_proof_reward_batch(
+    items: list[tuple[str, str | None]],
+    max_workers: int | None = None,
+) -> list[tuple[float, str]]:
     """
-    Same as lean_proof_reward but returns (reward, reason) so callers can show why it failed.
-    reason is e.g. "Proof is valid." on success, or Lean stderr / error message on failure.
+    Verify a batch of (solution_str, ground_truth) pairs concurrently.
+    At most max_workers Lean checks run at once (default: one per core, or
+    LEAN_REWARD_BATCH_WORKERS); with the warm pool enabled, checks that find no idle
+    warm worker within LEAN_REWARD_POOL_WAIT_S run on a cold Lean process. Each item
+    keeps its own timeout, so a slow proof only holds one slot while the rest of the
+    batch carries on.
+
+    Returns:
+        list of (reward, reason), in the same order as items
     """
-    return _lean_verify_with_reason(solution_str)
+    if not items:
+        return []
+    workers = min(max_workers or BATCH_MAX_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lean-batch") as executor:
+        return list(executor.map(lambda item: _lean_verify_with_reason(item[0]), items))
+
+
+SKIPPED_REASON = "Not checked: the problem already had enough valid proofs."
+
+
+@instrumented()
+def lean_verify_first_k(
+    items: list[tuple[Hashable, str]],
+    k: int = 1,
+    max_workers: int | None = None,
+    limits: LeanLimits | None = None,
+) -> list[LeanCheckResult]:
+    """
+    Verify (problem_id, solution_str) pairs until each problem has k valid proofs,
+    for pass@k-style rewards and rejection sampling that only need to know whether
+    enough completions of a problem succeed.
+
+    Checks are interleaved across problems, so every problem gets its first attempts
+    early. As soon as a problem reaches k successes, its queued checks are dropped and
+    its running ones are cancelled (their Lean process or pool worker is killed), and
+    the freed workers move on to other problems.
+
+    Returns:
+        list of LeanCheckResult in the same order as items; checks that were skipped
+        or cancelled have source "skipped", reward 0.0 and definitive False
+    """
+    if not items:
+        return []
+    limits = limits or DEFAULT_LIMITS
+    by_problem: dict[Hashable, list[int]] = defaultdict(list)
+    for i, (problem_id, _) in enumerate(items):
+        by_problem[problem_id].append(i)
+    # Round-robin over problems: the first completion of each, then the second, ...
+    order = [i for i in chain.from_iterable(zip_longest(*by_problem.values())) if i is not None]
+
+    results: list[LeanCheckResult | None] = [None] * len(items)
+    cancels = [threading.Event() for _ in items]
+    successes: dict[Hashable, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def skipped() -> LeanCheckResult:
+        return LeanCheckResult(0.0, SKIPPED_REASON, definitive=False, source="skipped")
+
+    def run(i: int) -> None:
+        problem_id, solution_str = items[i]
+        if cancels[i].is_set():
+            results[i] = skipped()
+            return
+        try:
+            result = lean_verify(solution_str, limits, cancels[i])
+        except CheckCancelled:
+            results[i] = skipped()
+            return
+        results[i] = result
+        if result.reward < 1.0:
+            return
+        with lock:
+            successes[problem_id] += 1
+            if successes[problem_id] == k:
+                for j in by_problem[problem_id]:
+                    cancels[j].set()
+
+    workers = min(max_workers or BATCH_MAX_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lean-first-k") as executor:
+        list(executor.map(run, order))
+    record_event("lean_verify_first_k", "skipped", sum(result.source == "skipped" for result in results))
+    return results
+
+
+def statement_only(source: str) -> str:
+    """
+    source with the proof of its theorem replaced by `sorry`, so that checking it only
+    elaborates the statement. Sources without a recognizable `:=` are returned as-is.
+    """
+    start = proof_start_offset(source)
+    return source if start is None else source[:start] + ":= sorry"
+
+
+@instrumented()
+def lean_statement_check_batch(
+    statements: list[str],
+    limits: LeanLimits | None = None,
+    cancel: threading.Event | None = None,
+) -> list[LeanCheckResult]:
+    """
+    Check that each `theorem ... := sorry` statement parses and elaborates; `sorry`
+    is accepted and whatever proof follows `:=` is ignored. reward is 1.0 for a
+    statement that elaborates without errors.
+
+    Statements run in as few Lean sessions as possible: with the warm pool, each pool
+    worker takes a share of the batch and elaborates its statements one REPL command
+    at a time; otherwise statements sharing imports and header are compiled together
+    in one `lake env lean` run, each in its own namespace. limits.wall_seconds applies
+    per statement.
+
+    Returns:
+        list of LeanCheckResult, in the same order as statements
+    """
+    limits = limits or DEFAULT_LIMITS
+    sources = [statement_only(statement) for statement in statements]
+    results: list[LeanCheckResult | None] = []
+    for statement, source in zip(statements, sources):
+        # Pre-filtered before truncation, which would hide a second declaration.
+        rejection = prefilter(statement, STATEMENT_RULES)
+        if rejection is not None:
+            results.append(LeanCheckResult(0.0, rejection, source="prefilter", diagnostics=message(rejection)))
+        else:
+            results.append(_lean_fast_path(source, rules=(), kind="statement"))
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        _check_pending_statements(sources, results, pending, limits, cancel)
+    for result in results:
+        _record_outcome("lean_statement_check_batch", result)
+    return results
+
+
+def _check_pending_statements(
+    sources: list[str],
+    results: list[LeanCheckResult | None],
+    pending: list[int],
+    limits: LeanLimits,
+    cancel: threading.Event | None,
+) -> None:
+    """Fill results[i] for every i in pending, sharding the checks over the pool workers."""
+    pool = get_default_pool()
+    shards = min(pool.size if pool is not None else 1, BATCH_MAX_WORKERS, len(pending))
+    chunks = [pending[k::shards] for k in range(shards)]
+    with ThreadPoolExecutor(max_workers=shards, thread_name_prefix="lean-statements") as executor:
+        checked = executor.map(
+            lambda chunk: _lean_check_statements([sources[i] for i in chunk], limits, cancel), chunks
+        )
+        for chunk, chunk_results in zip(chunks, checked):
+            for i, result in zip(chunk, chunk_results):
+                results[i] = result
+                _lean_remember(sources[i], result, kind="statement")
+
+
+def _lean_check_statements(
+    sources: list[str],
+    limits: LeanLimits,
+    cancel: threading.Event | None = None,
+) -> list[LeanCheckResult]:
+    """Uncached statement checks: the warm pool first, one Lean process per header otherwise."""
+    results: list[LeanCheckResult | None] = [None] * len(sources)
+    pool = get_default_pool()
+    if pool is not None:
+        try:
+            results = pool.check_statements(sources, timeout=limits.wall_seconds, cancel=cancel, limits=limits)
+        except LeanReplStartupError:
+            disable_default_pool()
+        except LeanReplError:
+            # Same fallback as _lean_check: every statement is re-checked cold below.
+            pass
+
+    groups: dict[tuple, list[int]] = {}
+    for i, result in enumerate(results):
+        if result is None:
+            submission = split_header(sources[i])
+            groups.setdefault((tuple(submission.imports), submission.header), []).append(i)
+    for (imports, header), indices in groups.items():
+        group_results = _lean_check_statement_group(
+            imports, header, [sources[i] for i in indices], limits, cancel
+        )
+        for i, result in zip(indices, group_results):
+            results[i] = result
+    return results
+
+
+def _lean_check_statement_group(
+    imports: tuple[str, ...],
+    header: str,
+    sources: list[str],
+    limits: LeanLimits,
+    cancel: threading.Event | None = None,
+) -> list[LeanCheckResult]:
+    """
+    Compile statements that share imports and header as one file, one namespace per
+    statement so their names cannot clash, and attribute each Lean message back to
+    its statement by line. Message positions are translated back to the statement's
+    own lines.
+    """
+    parts = [f"import {module}" for module in imports] + [header]
+    line_count = sum(part.count("\n") + 1 for part in parts)
+    spans = []
+    for k, source in enumerate(sources):
+        # The body keeps the statement's line numbering: imports and header are blanked.
+        body = split_header(source).body
+        parts += [f"namespace LeanRewardStatement{k}", body, f"end LeanRewardStatement{k}"]
+        first = line_count + 2
+        line_count += body.count("\n") + 3
+        spans.append((first, line_count - 1))
+    file_text = "\n".join(parts)
+
+    group_limits = replace(limits, wall_seconds=limits.wall_seconds * len(sources))
+    try:
+        if not LEAN_ENV_DIR.exists():
+            raise FileNotFoundError(f"Lean environment not found at {LEAN_ENV_DIR}")
+        argv = ['lake', 'env', 'lean', '--stdin', '--json']
+        if limits.max_heartbeats is not None:
+            argv.append(f'-DmaxHeartbeats={limits.max_heartbeats}')
+        run = run_lean_process(argv, LEAN_ENV_DIR, group_limits, input_text=file_text, cancel=cancel)
+    except Exception as e:
+        reason = f"Error verifying statement: {e}"
+        return [LeanCheckResult(0.0, reason, definitive=False, diagnostics=message(reason)) for _ in sources]
+    if run.cancelled:
+        raise CheckCancelled
+    if run.timed_out:
+        reason = f"Lean verification timed out ({group_limits.wall_seconds:g}s)."
+        return [
+            LeanCheckResult(0.0, reason, definitive=False, wall_time_s=run.wall_time_s,
+                            timed_out=True, diagnostics=message(reason))
+            for _ in sources
+        ]
+
+    per_statement = [LeanDiagnostics() for _ in sources]
+    for diagnostic in parse_lean_output(run.stdout, run.stderr):
+        owners = [k for k, (first, last) in enumerate(spans) if first <= diagnostic.line <= last]
+        if not owners:
+            # Header errors, lake failures: they concern every statement of the group.
+            for diagnostics in per_statement:
+                diagnostics.append(diagnostic)
+            continue
+        k = owners[0]
+        offset = spans[k][0] - 1
+        per_statement[k].append(replace(
+            diagnostic,
+            line=diagnostic.line - offset,
+            end_line=diagnostic.end_line - offset if diagnostic.end_line is not None else None,
+        ))
+
+    # Lean exits non-zero whenever some statement has errors; otherwise the failure is
+    # not explained by any message and counts against every statement.
+    unexplained = run.returncode != 0 and not any(d.errors for d in per_statement)
+    results = []
+    for diagnostics in per_statement:
+        if unexplained:
+            diagnostics = message(f"Lean exited with code {run.returncode} (no output).")
+        if diagnostics.errors:
+            reward = 0.0
+        else:
+            diagnostics.text = "Statement elaborates."
+            reward = 1.0
+        reason = str(diagnostics)
+        results.append(LeanCheckResult(
+            reward,
+            reason,
+            definitive=run.returncode >= 0 and "maximum number of heartbeats" not in reason,
+            source="process",
+            # The run's cost is shared by its statements.
+            wall_time_s=run.wall_time_s / len(sources),
+            cpu_time_s=run.cpu_time_s / len(sources),
+            peak_rss_mb=run.peak_rss_mb,
+            diagnostics=diagnostics,
+        ))
+    return results
+
+
+@instrumented()
+@osmosis_reward
+def lean_statement_reward(solution_str: str, ground_truth: str = None):
+    """
+    Reward function for autoformalization: 1.0 if the `theorem ... := sorry`
+    statement in solution_str parses and elaborates, 0.0 otherwise.
+    Only the statement is checked; the proof, if any, is never elaborated.
+    """
+    return lean_statement_check_batch([solution_str])[0].reward
+
+
+_ASYNC_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _async_semaphore() -> asyncio.Semaphore:
+    """Backpressure for the running event loop: at most ASYNC_MAX_CONCURRENCY checks."""
+    loop = asyncio.get_running_loop()
+    semaphore = _ASYNC_SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _ASYNC_SEMAPHORES[loop] = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+    return semaphore
+
+
+@instrumented()
+async def lean_verify_async(solution_str: str, limits: LeanLimits | None = None) -> LeanCheckResult:
+    """
+    Async counterpart of lean_verify. The Lean check runs in a worker thread so the
+    event loop never blocks, and cancelling the awaiting task kills the Lean process
+    doing the check (the cold process group, or the pool worker).
+    """
+    result = _lean_fast_path(solution_str)
+    if result is not None:
+        _record_outcome("lean_verify_async", result)
+        return result
+
+    async with _async_semaphore():
+        cancel = threading.Event()
+        try:
+            result = await asyncio.to_thread(_lean_check, solution_str, limits or DEFAULT_LIMITS, cancel)
+        except asyncio.CancelledError:
+            # The check thread notices within a few milliseconds and kills Lean.
+            cancel.set()
+            raise
+    _lean_remember(solution_str, result)
+    _record_outcome("lean_verify_async", result)
+    return result
+
+
+@instrumented()
+async def lean_proof_reward_async(solution_str: str, ground_truth: str = None) -> float:
+    """
+    Async version of lean_proof_reward for reward servers running in an event loop.
+    Never blocks the loop; at most ASYNC_MAX_CONCURRENCY checks run at once and
+    cancelling the call kills its Lean process.
+    """
+    result = await lean_verify_async(solution_str)
+    return shaped_reward(result.reward, result.diagnostics, solution_str)
+
 
+async def lean_proof_reward_with_reason_async(
+    solution_str: str, ground_truth: str = None
+) -> tuple[float, LeanDiagnostics]:
+    """Async version of lean_proof_reward_with_reason."""
+    result = await lean_verify_async(solution_str)
+    return shaped_reward(result.reward, result.diagnostics, solution_str), result.diagnostics
@@ -1,124 +1,364 @@
 """
-Simple test script for lean_proof_reward function.
+Verify Lean proofs offline: a single proof, or whole datasets of model outputs.
 
 Usage:
-1. Edit the INPUT_STRING variable below with your Lean proof
-2. Run: python reward_fn/lean_reward_examples.py
-3. See the score (1.0 or 0.0) and failure reason if applicable
+    # Check INPUT_STRING below and print the score and failure reason
+    python reward_fn/lean_reward_examples.py
+
+    # Verify every row of a JSONL or parquet file in parallel
+    python -m reward_fn.lean_reward_examples outputs.jsonl results/ --solution-column completion
+
+Datasets are streamed, so files larger than memory are fine. Every proof goes through
+lean_reward.lean_verify (pre-filter, verification cache, warm pool or cold Lean
+process, resource limits), with --workers checks in flight. Results are written to
+the output directory as parquet parts of --flush-rows rows each, which together read
+as one table (pyarrow.parquet.read_table(output_dir)). The directory doubles as the
+checkpoint: re-running the same command skips every row id already written.
 """
 
+import argparse
+import json
 import os
-import tempfile
-import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+from typing import Iterator
+
+if __package__ in (None, ""):
+    # Run as a script: make the reward_fn package importable.
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 # ============================================================================
 # EDIT THIS: Put your Lean proof string here
 # ============================================================================
 INPUT_STRING = """
-import Mathlib open scoped ENNReal NNReal Nat open MeasureTheory Real Set Filter Topology theorem poissonPMFRealSum_extracted (r : ℝ≥0) : HasSum (fun n => ProbabilityTheory.poissonPMFReal r n) 1 := sorry
+import Mathlib open scoped ENNReal NNReal Nat open MeasureTheory Real Set Filter Topology theorem sq_add_sq_nonneg_extracted (x y : ℝ) : 0 ≤ x ^ 2 + y ^ 2 := add_nonneg (sq_nonneg x) (sq_nonneg y)
 
 """
 
-# ============================================================================
-# Test function (includes detailed error reporting)
-# ============================================================================
+FLUSH_ROWS = 1000
+# Parquet batch size when streaming the input.
+READ_BATCH_ROWS = 4096
+CHECKPOINT_NAME = "_checkpoint.jsonl"
+# Memory set aside per warm worker when sizing the default pool. Every warm worker holds
+# its own copy of Mathlib, so the default pool only grows with the core count as far as
+# the available memory allows.
+WORKER_MEMORY_MB = 4096
 
-def test_lean_proof_with_details(solution_str: str):
-    """
-    Test a Lean proof and return detailed results.
 
-    Returns:
-        tuple: (score, error_message)
-            score: 1.0 if valid, 0.0 if invalid
-            error_message: None if valid, error details if invalid
-    """
+def available_memory_mb() -> float | None:
+    """Memory available for new processes (MemAvailable), else physical memory, else None."""
     try:
-        # Get the path to the lean_env directory
-        script_dir = Path(__file__).parent
-        project_root = script_dir.parent
-        lean_env_dir = project_root / "lean_env"
-
-        # Verify lean_env directory exists
-        if not lean_env_dir.exists():
-            return 0.0, f"Lean environment not found at {lean_env_dir}"
-
-        # Create a temporary .lean file in the lean_env directory
-        with tempfile.NamedTemporaryFile(
-            mode='w',
-            suffix='.lean',
-            dir=lean_env_dir,
-            delete=False
-        ) as temp_file:
-            temp_file.write(solution_str)
-            temp_file_path = temp_file.name
-
-        try:
-            # Use lake env lean to verify the proof
-            result = subprocess.run(
-                ['lake', 'env', 'lean', temp_file_path],
-                cwd=lean_env_dir,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            # Check if the proof is valid
-            if result.returncode == 0:
-                stderr_lower = result.stderr.lower()
-                if 'error' not in stderr_lower or len(result.stderr.strip()) == 0:
-                    return 1.0, None
-
-            # Collect error information
-            error_msg = "Lean compiler errors:\n"
-            if result.stderr:
-                error_msg += f"\nSTDERR:\n{result.stderr}"
-            if result.stdout:
-                error_msg += f"\nSTDOUT:\n{result.stdout}"
-            error_msg += f"\nReturn code: {result.returncode}"
-
-            return 0.0, error_msg
-
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-
-    except subprocess.TimeoutExpired:
-        return 0.0, "Timeout: Proof took longer than 30 seconds to verify"
-    except Exception as e:
-        return 0.0, f"Exception occurred: {str(e)}"
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (AttributeError, ValueError, OSError):
+        return None
 
 
-# ============================================================================
-# Run the test
-# ============================================================================
+def default_pool_size(checks: int) -> int:
+    """Warm workers for checks concurrent checks: one each, as far as memory allows."""
+    memory_mb = available_memory_mb()
+    if memory_mb is None:
+        return checks
+    return max(1, min(checks, int(memory_mb // WORKER_MEMORY_MB)))
 
-if __name__ == "__main__":
-    print("="*70)
-    print("LEAN PROOF REWARD TEST")
-    print("="*70)
 
+def check_single(solution_str: str) -> None:
+    """Check one proof and print the score and, if it failed, why."""
+    from reward_fn.lean_reward import lean_verify
+
+    print("=" * 70)
+    print("LEAN PROOF REWARD TEST")
+    print("=" * 70)
     print("\nInput String:")
-    print("-"*70)
-    print(INPUT_STRING)
-    print("-"*70)
+    print("-" * 70)
+    print(solution_str)
+    print("-" * 70)
 
     print("\nRunning Lean kernel check...")
-    score, error = test_lean_proof_with_details(INPUT_STRING)
-
-    print("\n" + "="*70)
-    print(f"RESULT: {score}")
-    print("="*70)
+    result = lean_verify(solution_str)
 
-    if score == 1.0:
+    print("\n" + "=" * 70)
+    print(f"RESULT: {result.reward}")
+    print("=" * 70)
+    if result.reward == 1.0:
         print("\n✓ SUCCESS: Proof is valid!")
         print("The Lean kernel accepted this proof.")
     else:
         print("\n✗ FAILURE: Proof is invalid")
         print("\nReason for failure:")
-        print("-"*70)
-        print(error)
-        print("-"*70)
+        print("-" * 70)
+        print(result.reason)
+        print("-" * 70)
+    print(f"\nChecked by: {result.source} in {result.wall_time_s:.2f}s")
+    print("\n" + "=" * 70)
+
+
+def iter_rows(input_path: str, solution_column: str, id_column: str | None) -> Iterator[tuple[str, str]]:
+    """Stream (row id, solution) pairs; the row id is id_column or the row number."""
+    if input_path.endswith(".jsonl") or input_path.endswith(".json"):
+        with open(input_path) as f:
+            row = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield str(record[id_column] if id_column else row), record.get(solution_column) or ""
+                row += 1
+        return
+
+    import pyarrow.parquet as pq
+
+    columns = [solution_column] + ([id_column] if id_column else [])
+    row = 0
+    for batch in pq.ParquetFile(input_path).iter_batches(batch_size=READ_BATCH_ROWS, columns=columns):
+        solutions = batch.column(solution_column).to_pylist()
+        ids = batch.column(id_column).to_pylist() if id_column else range(row, row + len(solutions))
+        for row_id, solution in zip(ids, solutions):
+            yield str(row_id), solution or ""
+        row += len(solutions)
+
+
+class ResultWriter:
+    """
+    Buffers results and writes them as numbered parquet parts. A part is written to a
+    temporary name, recorded in the checkpoint, then renamed. Only ids whose part file
+    exists count as done, so an interrupted flush is simply redone. Part numbers
+    continue after every part named in the checkpoint or the directory: reusing the
+    name of a part recorded but never renamed would count its lost ids as done.
+    """
+
+    def __init__(self, output_dir: Path):
+        import pyarrow as pa
+
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoint = output_dir / CHECKPOINT_NAME
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("reward", pa.float64()),
+            ("reason", pa.string()),
+            ("source", pa.string()),
+            ("definitive", pa.bool_()),
+            ("timed_out", pa.bool_()),
+            ("wall_time_s", pa.float64()),
+        ])
+        self.buffer: list[dict] = []
+        self.completed, self.next_part = self._load()
+
+    def _load(self) -> tuple[set[str], int]:
+        for stray in self.output_dir.glob("*.parquet.tmp"):
+            stray.unlink()
+        completed: set[str] = set()
+        parts = [p.name for p in self.output_dir.glob("part-*.parquet")]
+        if self.checkpoint.exists():
+            for line in self.checkpoint.read_text().splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                parts.append(entry["part"])
+                if (self.output_dir / entry["part"]).exists():
+                    completed.update(entry["ids"])
+        numbers = [int(name.split("-")[1].split(".")[0]) for name in parts]
+        return completed, max(numbers, default=-1) + 1
 
-    print("\n" + "="*70)
+    def add(self, row_id: str, result) -> None:
+        self.buffer.append({
+            "id": row_id,
+            "reward": result.reward,
+            "reason": result.reason,
+            "source": result.source,
+            "definitive": result.definitive,
+            "timed_out": result.timed_out,
+            "wall_time_s": result.wall_time_s,
+        })
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        name = f"part-{self.next_part:05d}.parquet"
+        tmp = self.output_dir / (name + ".tmp")
+        pq.write_table(pa.Table.from_pylist(self.buffer, schema=self.schema), tmp)
+        ids = [row["id"] for row in self.buffer]
+        with open(self.checkpoint, "a") as f:
+            f.write(json.dumps({"part": name, "ids": ids}) + "\n")
+        tmp.rename(self.output_dir / name)
+        self.completed.update(ids)
+        self.next_part += 1
+        self.buffer = []
+
+
+class Progress:
+    """Live throughput line on stderr, redrawn at most once a second."""
+
+    def __init__(self, skipped: int):
+        self.start = self.last_draw = time.monotonic()
+        self.skipped = skipped
+        self.done = self.valid = self.timed_out = 0
+        self.window: deque[tuple[float, int]] = deque([(self.start, 0)])
+
+    def update(self, result) -> None:
+        self.done += 1
+        self.valid += result.reward >= 1.0
+        self.timed_out += result.timed_out
+        now = time.monotonic()
+        if now - self.last_draw >= 1.0:
+            self.draw(now)
+
+    def draw(self, now: float | None = None, end: str = "\r") -> None:
+        now = now or time.monotonic()
+        self.last_draw = now
+        self.window.append((now, self.done))
+        while len(self.window) > 2 and now - self.window[0][0] > 10.0:
+            self.window.popleft()
+        then, done_then = self.window[0]
+        recent = (self.done - done_then) / (now - then) if now > then else 0.0
+        overall = self.done / (now - self.start) if now > self.start else 0.0
+        valid = self.valid / self.done if self.done else 0.0
+        print(
+            f"{self.done:,} verified, {self.skipped:,} already done | {overall:.1f}/s "
+            f"(last 10s {recent:.1f}/s) | valid {valid:.1%}, timeouts {self.timed_out:,}",
+            end=end, file=sys.stderr, flush=True,
+        )
+
+
+def verify_corpus(
+    input_path: str,
+    output_dir: str,
+    solution_column: str = "prediction",
+    id_column: str | None = None,
+    workers: int | None = None,
+    flush_rows: int = FLUSH_ROWS,
+    limits=None,
+) -> dict:
+    """
+    Verify every row of input_path not yet in output_dir and write the results there.
+    Returns counts of the rows verified in this run.
+    """
+    from reward_fn.lean_reward import BATCH_MAX_WORKERS, lean_verify
+
+    workers = workers or BATCH_MAX_WORKERS
+    writer = ResultWriter(Path(output_dir))
+    progress = Progress(skipped=len(writer.completed))
+    lock = threading.Lock()
+
+    def verify(row_id: str, solution_str: str) -> None:
+        result = lean_verify(solution_str, limits)
+        with lock:
+            writer.add(row_id, result)
+            progress.update(result)
+            if len(writer.buffer) >= flush_rows:
+                writer.flush()
+
+    # Bounded in-flight work, so the input is streamed rather than loaded up front.
+    max_pending = workers * 4
+    pending = set()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lean-corpus")
+    try:
+        for row_id, solution_str in iter_rows(input_path, solution_column, id_column):
+            if row_id in writer.completed:
+                continue
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+            pending.add(executor.submit(verify, row_id, solution_str))
+        for future in pending:
+            future.result()
+    finally:
+        # On Ctrl-C, drop queued rows but keep the ones already verified.
+        executor.shutdown(wait=True, cancel_futures=True)
+        with lock:
+            writer.flush()
+        progress.draw(end="\n")
+    return {
+        "verified": progress.done,
+        "valid": progress.valid,
+        "timed_out": progress.timed_out,
+        "skipped": progress.skipped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Verify a single Lean proof, or every proof in a JSONL/parquet dataset",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Check INPUT_STRING in this file
+  python reward_fn/lean_reward_examples.py
+
+  # Verify a dataset on the warm pool, writing parquet parts to results/
+  python -m reward_fn.lean_reward_examples outputs.parquet results/ --id-column sample_id
+
+  # Resume after an interruption: run the same command again
+        """
+    )
+    parser.add_argument('input', nargs='?', help='JSONL or parquet file of proofs (default: check INPUT_STRING)')
+    parser.add_argument('output', nargs='?', help='Directory for the parquet results and checkpoint')
+    parser.add_argument('--solution-column', default='prediction',
+                        help='Column holding the Lean code (default: prediction)')
+    parser.add_argument('--id-column', help='Column with a unique row id (default: the row number)')
+    parser.add_argument('--workers', type=int,
+                        help='Lean checks in flight at once (default: the number of cores); checks '
+                             'that find no idle warm worker within LEAN_REWARD_POOL_WAIT_S seconds '
+                             'run on a cold Lean process')
+    parser.add_argument('--pool-size', type=int,
+                        help='Warm Lean workers, each loading Mathlib (default: LEAN_REWARD_POOL_SIZE, '
+                             'else --workers or the number of cores, capped at the available memory '
+                             f'divided by {WORKER_MEMORY_MB} MB per worker; 0 disables the pool)')
+    parser.add_argument('--flush-rows', type=int, default=FLUSH_ROWS,
+                        help=f'Results per parquet part and checkpoint (default: {FLUSH_ROWS})')
+    args = parser.parse_args()
+
+    if args.input is None:
+        check_single(INPUT_STRING)
+        return 0
+    if args.output is None:
+        parser.error("An output directory is required when verifying a dataset")
+    if args.workers is not None and args.workers <= 0:
+        parser.error("Workers must be greater than 0")
+    if args.flush_rows <= 0:
+        parser.error("Flush rows must be greater than 0")
+    if args.pool_size is not None and args.pool_size < 0:
+        parser.error("Pool size must be 0 or greater")
+
+    # Read when lean_reward is first imported. Checks beyond the pool size wait briefly
+    # for a free warm worker and otherwise run cold, so every core stays busy even when
+    # memory only fits a few warm workers.
+    workers = args.workers or os.cpu_count() or 1
+    pool_size = args.pool_size
+    if pool_size is None:
+        pool_size = int(os.getenv("LEAN_REWARD_POOL_SIZE") or default_pool_size(workers))
+    os.environ["LEAN_REWARD_POOL_SIZE"] = str(pool_size)
+    try:
+        summary = verify_corpus(
+            args.input,
+            args.output,
+            solution_column=args.solution_column,
+            id_column=args.id_column,
+            workers=workers,
+            flush_rows=args.flush_rows,
+        )
+    except KeyboardInterrupt:
+        print("\n\nInterrupted; run the same command again to resume")
+        return 1
+    print(f"Verified {summary['verified']:,} rows ({summary['valid']:,} valid, "
+          f"{summary['timed_out']:,} timed out); {summary['skipped']:,} were already done")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,377 @@
+"""
+Offline rubric scoring of whole datasets through a provider batch endpoint.
+
+Reads a parquet or JSONL file of predictions, scores locally whatever the local
+similarity pre-pass or the rubric cache can answer, and submits the rest as chunked
+JSONL uploads in the OpenAI Batch format:
+    {"custom_id": "row-17", "method": "POST", "url": "/v1/chat/completions",
+     "body": {"model": "...", "messages": [...]}}
+Submitted batches are polled until they finish and their scores are written back as a
+new column of a parquet file. Progress lives in a state file next to the output, so an
+interrupted run picks up its submitted batches instead of paying for them again: each
+chunk's uploaded input file is recorded before its batch is created, and a resumed run
+first looks for a batch already created from that file. Rows of batches that fail,
+expire or are cancelled are resubmitted, up to MAX_BATCH_ATTEMPTS times.
+Scores returned by the provider are also stored in the rubric cache, under the key the
+online scorers look them up with.
+
+    python -m reward_rubric.batch_offline preds.parquet scored.parquet
+    python -m reward_rubric.batch_offline preds.jsonl scored.parquet --backend local
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+from reward_rubric.lean_rubric_openai import (
+    MODEL,
+    RUBRIC,
+    SCORE_MAX,
+    SCORE_MIN,
+    precheck,
+    rubric_cache_key,
+)
+from reward_rubric.lean_similarity import statement_similarity
+from reward_rubric.rubric_cache import get_default_cache
+from reward_rubric.rubric_client import BASE_URL, build_messages, parse_score
+
+# OpenAI accepts at most 50,000 requests per batch input file.
+CHUNK_SIZE = 50000
+POLL_INTERVAL_S = 60.0
+# Batch states after which a batch will not change any more.
+FINAL_STATES = frozenset({"completed", "failed", "expired", "cancelled"})
+# Batches a row is submitted in at most, counting resubmissions after a batch that did
+# not complete.
+MAX_BATCH_ATTEMPTS = 3
+
+
+class OpenAIBatchBackend:
+    """The provider's Files + Batches API."""
+
+    # Its scores come from the model, so they may be cached as model scores.
+    model_scores = True
+
+    def __init__(self, base_url: str | None = BASE_URL):
+        from openai import OpenAI
+
+        self.client = OpenAI(base_url=base_url)
+
+    def upload(self, input_path: Path) -> str:
+        """File id of input_path, uploaded as a batch input file."""
+        with open(input_path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch").id
+
+    def create(self, input_file_id: str) -> str:
+        """Id of a new batch over an uploaded input file."""
+        batch = self.client.batches.create(
+            input_file_id=input_file_id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    def find_batch(self, input_file_id: str) -> str | None:
+        """Id of a batch already created from input_file_id, if there is one."""
+        uploaded_at = self.client.files.retrieve(input_file_id).created_at
+        # Newest first; anything older than the file cannot have been created from it.
+        for batch in self.client.batches.list(limit=100):
+            if batch.created_at < uploaded_at:
+                break
+            if batch.input_file_id == input_file_id:
+                return batch.id
+        return None
+
+    def status(self, batch_id: str) -> tuple[str, str | None, str | None]:
+        """(status, output file id, error file id)."""
+        batch = self.client.batches.retrieve(batch_id)
+        return batch.status, batch.output_file_id, batch.error_file_id
+
+    def download(self, file_id: str) -> str:
+        return self.client.files.content(file_id).text
+
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for the batch endpoint, for testing offline. Batches live
+    under directory/<batch id>/ and are answered with the local similarity score the
+    first time their status is polled, in the provider's output format.
+    """
+
+    # Its scores are local similarities and must not be cached as model scores.
+    model_scores = False
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def upload(self, input_path: Path) -> str:
+        file_id = f"file_local_{uuid.uuid4().hex[:16]}"
+        (self.directory / f"{file_id}.jsonl").write_bytes(Path(input_path).read_bytes())
+        return file_id
+
+    def create(self, input_file_id: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:16]}"
+        batch_dir = self.directory / batch_id
+        batch_dir.mkdir()
+        (batch_dir / "input.jsonl").write_bytes((self.directory / f"{input_file_id}.jsonl").read_bytes())
+        (batch_dir / "input_file_id").write_text(input_file_id)
+        return batch_id
+
+    def find_batch(self, input_file_id: str) -> str | None:
+        for marker in self.directory.glob("batch_local_*/input_file_id"):
+            if marker.read_text() == input_file_id:
+                return marker.parent.name
+        return None
+
+    def status(self, batch_id: str) -> tuple[str, str | None, str | None]:
+        batch_dir = self.directory / batch_id
+        output = batch_dir / "output.jsonl"
+        if not output.exists():
+            lines = []
+            for line in (batch_dir / "input.jsonl").read_text().splitlines():
+                request = json.loads(line)
+                user = request["body"]["messages"][-1]["content"]
+                predicted, _, ground_truth = user.partition("\n\nGround truth:\n")
+                score = statement_similarity(predicted.removeprefix("Predicted:\n"), ground_truth)
+                lines.append(json.dumps({
+                    "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"message": {"role": "assistant", "content": f"{score:.4f}"}}]},
+                    },
+                    "error": None,
+                }))
+            # Written atomically, so a crash never leaves a half-answered batch behind.
+            tmp = output.with_suffix(".tmp")
+            tmp.write_text("\n".join(lines) + "\n")
+            tmp.rename(output)
+        return "completed", f"{batch_id}/output.jsonl", None
+
+    def download(self, file_id: str) -> str:
+        return (self.directory / file_id).read_text()
+
+
+def read_table(path: str) -> pa.Table:
+    if path.endswith(".jsonl") or path.endswith(".json"):
+        return pa_json.read_json(path)
+    return pq.read_table(path)
+
+
+def _load_state(state_path: Path, input_path: str) -> dict:
+    if state_path.exists():
+        state = json.loads(state_path.read_text())
+        if state.get("input") != os.path.abspath(input_path):
+            raise ValueError(f"{state_path} belongs to {state.get('input')}, not {input_path}")
+        return state
+    return {"input": os.path.abspath(input_path), "scores": {}, "errors": {}, "chunks": None}
+
+
+def _save_state(state_path: Path, state: dict) -> None:
+    tmp = state_path.with_suffix(state_path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(state_path)
+
+
+def _collect(state: dict, backend, output_file_id: str | None, error_file_id: str | None) -> None:
+    """Record the scores (or errors) of a finished batch in state."""
+    for file_id in (output_file_id, error_file_id):
+        if not file_id:
+            continue
+        for line in backend.download(file_id).splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            row = record["custom_id"].removeprefix("row-")
+            response = record.get("response") or {}
+            try:
+                if record.get("error") or response.get("status_code") != 200:
+                    raise ValueError(str(record.get("error") or response.get("body")))
+                content = response["body"]["choices"][0]["message"]["content"]
+                state["scores"][row] = parse_score(content, SCORE_MIN, SCORE_MAX)
+                state["errors"].pop(row, None)
+            except (KeyError, IndexError, ValueError) as e:
+                state["errors"][row] = str(e)[:500]
+
+
+def _submit(
+    state: dict, state_file: Path, index: int, backend, work_dir: Path, predictions: list, ground_truths: list
+) -> None:
+    """
+    Upload chunk index of state and create its batch. The input file id is saved
+    before the batch is created, so a run interrupted in between finds that batch
+    with backend.find_batch instead of creating (and paying for) a second one.
+    """
+    chunk = state["chunks"][index]
+    if chunk.get("file_id") is None:
+        work_dir.mkdir(parents=True, exist_ok=True)
+        chunk_path = work_dir / f"chunk-{index:05d}.jsonl"
+        with open(chunk_path, "w") as f:
+            for row in chunk["rows"]:
+                f.write(json.dumps({
+                    "custom_id": f"row-{row}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {"model": MODEL, "messages": build_messages(RUBRIC, predictions[row] or "", ground_truths[row])},
+                }) + "\n")
+        chunk["file_id"] = backend.upload(chunk_path)
+        _save_state(state_file, state)
+    else:
+        chunk["batch_id"] = backend.find_batch(chunk["file_id"])
+    if chunk["batch_id"] is None:
+        chunk["batch_id"] = backend.create(chunk["file_id"])
+    _save_state(state_file, state)
+    print(f"Submitted chunk {index} ({len(chunk['rows']):,} rows) as {chunk['batch_id']}")
+
+
+def score_dataset(
+    input_path: str,
+    output_path: str,
+    backend,
+    prediction_column: str = "prediction",
+    ground_truth_column: str = "ground_truth",
+    score_column: str = "rubric_score",
+    chunk_size: int = CHUNK_SIZE,
+    poll_interval: float = POLL_INTERVAL_S,
+    state_path: str | None = None,
+) -> pa.Table:
+    """
+    Score every row of input_path and write it, plus score_column, to output_path.
+    Rows of a batch that did not complete are resubmitted in a new chunk, up to
+    MAX_BATCH_ATTEMPTS batches per row. Rows still unscored after that get a null
+    score; their errors are kept in the state file. Re-running with the same
+    arguments resumes an interrupted run.
+    """
+    cache = get_default_cache() if backend.model_scores else None
+    table = read_table(input_path)
+    predictions = table.column(prediction_column).to_pylist()
+    ground_truths = table.column(ground_truth_column).to_pylist()
+    state_file = Path(state_path or f"{output_path}.state.json")
+    state = _load_state(state_file, input_path)
+    work_dir = state_file.with_suffix(".chunks")
+
+    if state["chunks"] is None:
+        # Local pre-pass: similarity shortcuts and cached scores never reach the batch.
+        pending = []
+        for row, (prediction, ground_truth) in enumerate(zip(predictions, ground_truths)):
+            score, _, _, _ = precheck(prediction or "", ground_truth or "", {})
+            if score is None:
+                pending.append(row)
+            else:
+                state["scores"][str(row)] = score
+        state["chunks"] = [
+            {
+                "rows": pending[start:start + chunk_size],
+                "file_id": None,
+                "batch_id": None,
+                "done": False,
+                "attempt": 1,
+            }
+            for start in range(0, len(pending), chunk_size)
+        ]
+        _save_state(state_file, state)
+        print(f"{len(predictions) - len(pending):,} rows scored locally, "
+              f"{len(pending):,} in {len(state['chunks'])} batch(es)")
+
+    while not all(chunk["done"] for chunk in state["chunks"]):
+        for index, chunk in enumerate(state["chunks"]):
+            if chunk["batch_id"] is None:
+                _submit(state, state_file, index, backend, work_dir, predictions, ground_truths)
+
+        for index, chunk in enumerate(list(state["chunks"])):
+            while not chunk["done"]:
+                status, output_file_id, error_file_id = backend.status(chunk["batch_id"])
+                if status not in FINAL_STATES:
+                    print(f"Chunk {index} {status}; polling again in {poll_interval:g}s", end="\r")
+                    time.sleep(poll_interval)
+                    continue
+                _collect(state, backend, output_file_id, error_file_id)
+                unscored = []
+                for row in chunk["rows"]:
+                    score = state["scores"].get(str(row))
+                    if score is None:
+                        state["errors"].setdefault(str(row), f"batch {status}")
+                        unscored.append(row)
+                    elif cache is not None:
+                        # The batch sent build_messages prompts, i.e. the single-pair format.
+                        cache.put(rubric_cache_key(predictions[row] or "", ground_truths[row] or ""), score)
+                chunk["done"] = True
+                attempt = chunk.get("attempt", 1)
+                if status != "completed" and unscored and attempt < MAX_BATCH_ATTEMPTS:
+                    state["chunks"].append(
+                        {"rows": unscored, "file_id": None, "batch_id": None, "done": False, "attempt": attempt + 1}
+                    )
+                    print(f"Chunk {index} {status}; resubmitting its {len(unscored):,} unscored rows")
+                else:
+                    print(f"Chunk {index} {status}")
+                _save_state(state_file, state)
+
+    scores = pa.array([state["scores"].get(str(row)) for row in range(len(predictions))], type=pa.float64())
+    if score_column in table.column_names:
+        table = table.drop_columns([score_column])
+    table = table.append_column(score_column, scores)
+    pq.write_table(table, output_path)
+    print(f"Wrote {output_path}: {len(predictions) - scores.null_count:,} scored, "
+          f"{scores.null_count:,} failed")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score a dataset of predictions with the Lean rubric through a batch endpoint",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Score through the provider's Batch API (needs OPENAI_API_KEY)
+  python -m reward_rubric.batch_offline preds.parquet scored.parquet
+
+  # Offline dry run against the file-based stand-in
+  python -m reward_rubric.batch_offline preds.jsonl scored.parquet --backend local
+        """
+    )
+    parser.add_argument('input', help='Parquet or JSONL file with prediction and ground truth columns')
+    parser.add_argument('output', help='Parquet file to write, with the score column added')
+    parser.add_argument('--backend', choices=['openai', 'local'], default='openai')
+    parser.add_argument('--local-dir', default='.batch_local',
+                        help='Directory of the local backend (default: .batch_local)')
+    parser.add_argument('--prediction-column', default='prediction')
+    parser.add_argument('--ground-truth-column', default='ground_truth')
+    parser.add_argument('--score-column', default='rubric_score')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Requests per uploaded batch file (default: {CHUNK_SIZE})')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL_S,
+                        help=f'Seconds between status checks (default: {POLL_INTERVAL_S:g})')
+    parser.add_argument('--state', help='Resume state file (default: <output>.state.json)')
+    args = parser.parse_args()
+
+    if args.chunk_size <= 0:
+        parser.error("Chunk size must be greater than 0")
+    backend = LocalBatchBackend(args.local_dir) if args.backend == 'local' else OpenAIBatchBackend()
+    try:
+        score_dataset(
+            args.input,
+            args.output,
+            backend,
+            prediction_column=args.prediction_column,
+            ground_truth_column=args.ground_truth_column,
+            score_column=args.score_column,
+            chunk_size=args.chunk_size,
+            poll_interval=args.poll_interval,
+            state_path=args.state,
+        )
+    except KeyboardInterrupt:
+        print("\n\nInterrupted; run the same command again to resume")
+        return 1
+    except Exception as e:
+        print(f"\n\nError: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
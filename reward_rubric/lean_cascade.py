@@ -0,0 +1,150 @@
+"""
+Tiered autoformalization reward: cheap stages first, the LLM rubric last.
+
+Each sample runs through the configured stages in order, and the first stage that can
+decide returns the score:
+    lexical  0 when the prediction fails the statement pre-filter (empty, no theorem,
+             unbalanced brackets, several declarations)
+    exact    1 when prediction and ground truth normalize to the same tokens
+             (lean_similarity: formatting, notation, variable renaming)
+    lean     0 when the predicted statement does not elaborate
+    llm      the rubric model's score (compute_rubric_score_openai, with its local
+             similarity shortcut and cache)
+A sample no stage decides gets the local similarity score, stage "similarity".
+LEAN_CASCADE_STAGES selects and orders the stages, e.g. "lexical,exact,llm" to skip Lean.
+"""
+
+import asyncio
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from osmosis_ai import osmosis_rubric
+
+from reward_fn.instrumentation import instrumented, record_event
+from reward_fn.lean_prefilter import STATEMENT_RULES, prefilter
+from reward_fn.lean_reward import lean_statement_check_batch
+from reward_rubric.lean_rubric_openai import compute_rubric_score_openai_batch_async
+from reward_rubric.lean_similarity import normalize_statement, statement_similarity
+from reward_rubric.rubric_client import run_sync
+
+STAGES = ("lexical", "exact", "lean", "llm")
+DEFAULT_STAGES = tuple(
+    stage
+    for stage in os.getenv("LEAN_CASCADE_STAGES", ",".join(STAGES)).replace(" ", "").split(",")
+    if stage
+)
+
+_FENCE_RE = re.compile(r"```(?:lean4?|Lean4?)?[ \t]*\n(.*?)```", re.DOTALL)
+
+_STATS: Counter = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+@dataclass
+class CascadeResult:
+    score: float
+    # The stage that decided: "lexical", "exact", "lean", "llm" or "similarity".
+    stage: str
+    detail: str = ""
+
+
+def extract_statement(solution_str: str) -> str:
+    """The Lean code of a model response: the first fenced block if there is one."""
+    match = _FENCE_RE.search(solution_str or "")
+    return match.group(1) if match else (solution_str or "")
+
+
+@instrumented("lean_cascade_batch")
+async def lean_cascade_batch_async(
+    items: list[tuple[str, str, dict | None]],
+    stages: tuple[str, ...] | None = None,
+) -> list[CascadeResult]:
+    """
+    Score (solution_str, ground_truth, extra_info) items through the cascade.
+    Each stage runs once for all samples still undecided, so the Lean stage validates
+    them in one warm session and the LLM stage goes out as one concurrent batch.
+    The Lean stage runs in a worker thread, so the event loop keeps serving while it
+    waits.
+
+    Returns:
+        list of CascadeResult in the same order as items
+    """
+    stages = DEFAULT_STAGES if stages is None else stages
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown cascade stages: {sorted(unknown)}")
+
+    statements = [extract_statement(item[0]) for item in items]
+    results: list[CascadeResult | None] = [None] * len(items)
+    for stage in stages:
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            break
+        if stage == "lexical":
+            for i in pending:
+                rejection = prefilter(statements[i], STATEMENT_RULES)
+                if rejection is not None:
+                    results[i] = CascadeResult(0.0, stage, rejection)
+        elif stage == "exact":
+            for i in pending:
+                predicted = normalize_statement(statements[i])
+                if predicted is not None and predicted == normalize_statement(items[i][1] or ""):
+                    results[i] = CascadeResult(1.0, stage, "statements match up to normalization")
+        elif stage == "lean":
+            checks = await asyncio.to_thread(lean_statement_check_batch, [statements[i] for i in pending])
+            for i, check in zip(pending, checks):
+                # Timeouts and a missing lean_env say nothing; leave those to later stages.
+                if check.reward < 1.0 and check.definitive:
+                    results[i] = CascadeResult(0.0, stage, check.reason)
+        elif stage == "llm":
+            scored = await compute_rubric_score_openai_batch_async(
+                [(statements[i], items[i][1], items[i][2] or {}) for i in pending]
+            )
+            for i, item_result in zip(pending, scored):
+                if item_result.score is not None:
+                    results[i] = CascadeResult(item_result.score, stage, item_result.source)
+
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = CascadeResult(statement_similarity(statements[i], items[i][1]), "similarity")
+    with _STATS_LOCK:
+        _STATS.update(result.stage for result in results)
+    for result in results:
+        record_event("lean_cascade_batch", result.stage)
+    return results
+
+
+def lean_cascade_batch(
+    items: list[tuple[str, str, dict | None]],
+    stages: tuple[str, ...] | None = None,
+) -> list[CascadeResult]:
+    """
+    Blocking version of lean_cascade_batch_async. It runs on rubric_client's shared
+    background loop, so per-sample calls reuse one model client and its connection
+    pool, and it can be called from inside a running event loop.
+    """
+    return run_sync(lean_cascade_batch_async(items, stages))
+
+
+@instrumented()
+@osmosis_rubric
+def compute_cascade_score(
+    solution_str: str,
+    ground_truth: str,
+    extra_info: dict,
+    **kwargs
+) -> float:
+    """
+    Score an autoformalized statement through the reward cascade, calling Lean and
+    the rubric model only when the cheaper stages cannot decide.
+    """
+    return lean_cascade_batch([(solution_str, ground_truth, extra_info)])[0].score
+
+
+def cascade_stats() -> dict[str, int]:
+    """How many samples each stage decided."""
+    with _STATS_LOCK:
+        return dict(_STATS)
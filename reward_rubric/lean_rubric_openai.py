@@ -2,8 +2,22 @@ from osmosis_ai import (
     evaluate_rubric,
     osmosis_rubric,
 )
+import asyncio
 import os
 
+from reward_fn.instrumentation import instrumented, record_event
+from reward_rubric.lean_similarity import normalize_statement, statement_similarity
+from reward_rubric.rubric_cache import RubricCache, get_default_cache
+from reward_rubric.rubric_client import (
+    CONCURRENCY,
+    PACK_SIZE,
+    RubricItemResult,
+    RubricRequestError,
+    get_client,
+    prompt_format,
+    run_sync,
+)
+
 # make life easier by hardcoding the rubric, score range and model info
 RUBRIC = """
 You are a Lean4 statement similarity scorer.
@@ -33,7 +47,18 @@ SCORE_MAX = 1.0
 PROVIDER = "openai"
 MODEL = "gpt-5-mini"
 API_KEY = os.getenv("OPENAI_API_KEY")
+# Pairs whose local similarity score reaches this are scored locally, without a model
+# call. The default 1 only takes exact matches after normalization: a near match can
+# still differ in one operator or literal (≥ for ≤, 2/3 for 3/2) and score above 0.95.
+# Set above 1 to always ask the model.
+LOCAL_SCORE_THRESHOLD = float(os.getenv("LEAN_RUBRIC_LOCAL_THRESHOLD", "1"))
+# Prompt formats scores are cached under: one pair per request, several pairs per
+# request, and osmosis_ai's evaluate_rubric template.
+SINGLE_FORMAT = prompt_format(RUBRIC)
+PACKED_FORMAT = prompt_format(RUBRIC, packed=True)
+EVALUATE_RUBRIC_FORMAT = "evaluate_rubric"
 
+@instrumented()
 @osmosis_rubric
 def compute_rubric_score_openai(
     solution_str: str,
@@ -43,19 +68,196 @@ def compute_rubric_score_openai(
 ) -> float:
     """
     Delegate rubric scoring to a hosted model while keeping @osmosis_rubric validation.
+    Exact matches up to normalization, and predictions that are not a theorem
+    statement at all, are scored locally by lean_similarity instead.
+
+    With PROVIDER "openai" the request goes through the shared rubric_client, like the
+    batch scorers do. It uses the same fixed-prefix prompt, prompt_cache_key, rate
+    limits, retries and usage_stats accounting. Any other PROVIDER is scored with
+    osmosis_ai's evaluate_rubric, as before.
+
+    Model scores are memoized (see rubric_cache). extra_info["rubric_cache"] switches
+    this per call: False bypasses the cache, "refresh" re-queries the model and
+    overwrites the cached score.
     """
-    model_info = {"provider": PROVIDER, "model": MODEL, "api_key": API_KEY}
-    prompt_metadata = extra_info.get("metadata")
+    if PROVIDER != "openai":
+        return _evaluate_rubric_score(solution_str, ground_truth, extra_info)
+    score, source, cache, cache_key = precheck(solution_str, ground_truth, extra_info)
+    record_event("compute_rubric_score_openai", source)
+    if score is not None:
+        return score
+
+    async def ask() -> float:
+        score, _ = await get_client(MODEL, API_KEY).score(
+            RUBRIC, solution_str, ground_truth, extra_info.get("metadata"), SCORE_MIN, SCORE_MAX
+        )
+        return score
+
+    score = run_sync(ask())
+    if cache is not None:
+        cache.put(cache_key, score)
+    return score
+
 
+def _evaluate_rubric_score(solution_str: str, ground_truth: str, extra_info: dict) -> float:
+    """compute_rubric_score_openai for providers rubric_client cannot talk to."""
+    score, source, cache, cache_key = precheck(solution_str, ground_truth, extra_info, EVALUATE_RUBRIC_FORMAT)
+    record_event("compute_rubric_score_openai", source)
+    if score is not None:
+        return score
+
+    model_info = {"provider": PROVIDER, "model": MODEL, "api_key": API_KEY}
     result = evaluate_rubric(
         rubric=RUBRIC,
         solution_str=solution_str,
         model_info=model_info,
         ground_truth=ground_truth,
-        metadata=prompt_metadata,
+        metadata=extra_info.get("metadata"),
         score_min=SCORE_MIN,
         score_max=SCORE_MAX,
         return_details=False,
     )
+    score = float(result)
+    if cache is not None:
+        cache.put(cache_key, score)
+    return score
 
-    return float(result)
+
+def rubric_cache_key(
+    solution_str: str, ground_truth: str, metadata: dict | None = None, request_format: str = SINGLE_FORMAT
+) -> str:
+    """RubricCache key of this rubric's model score for the pair in request_format."""
+    return RubricCache.key(
+        RUBRIC, PROVIDER, MODEL, SCORE_MIN, SCORE_MAX, solution_str, ground_truth, metadata, request_format
+    )
+
+
+def precheck(
+    solution_str: str, ground_truth: str, extra_info: dict, request_format: str = SINGLE_FORMAT
+) -> tuple[float | None, str, RubricCache | None, str | None]:
+    """
+    (score, source, cache, cache_key): the local or cached score when there is one,
+    otherwise score is None and the model's score should be stored under cache_key.
+    request_format is the prompt format the model will be asked in; scores from other formats
+    are not reused.
+    """
+    local_score = statement_similarity(solution_str, ground_truth)
+    if local_score >= LOCAL_SCORE_THRESHOLD or not normalize_statement(solution_str or ""):
+        return local_score, "local", None, None
+
+    cache_mode = extra_info.get("rubric_cache", True)
+    cache = get_default_cache() if cache_mode else None
+    if cache is None:
+        return None, "model", None, None
+    cache_key = rubric_cache_key(solution_str, ground_truth, extra_info.get("metadata"), request_format)
+    cached = cache.get(cache_key) if cache_mode != "refresh" else None
+    if cached is not None:
+        return cached, "cache", None, None
+    return None, "model", cache, cache_key
+
+
+@instrumented()
+async def compute_rubric_score_openai_batch_async(
+    items: list[tuple[str, str, dict | None]],
+    concurrency: int | None = None,
+    pack_size: int | None = None,
+) -> list[RubricItemResult]:
+    """
+    Score a batch of (solution_str, ground_truth, extra_info) items concurrently.
+    Local and cached scores are answered without a request. The rest are packed
+    pack_size pairs per request (default LEAN_RUBRIC_PACK_SIZE), so the rubric is sent
+    once per pack; when a packed reply does not score exactly its pairs 1..n, each of
+    them is re-sent in a pack of its own. With
+    pack_size 1 every pair is sent in the single-pair format instead. Either way all
+    requests of a batch use one prompt format, the one its scores are cached under. At most
+    concurrency (default LEAN_RUBRIC_CONCURRENCY) requests are in flight, all through
+    one pooled client under the rubric_client rate limits, with 429/5xx retried.
+
+    Batches need an OpenAI-compatible endpoint (see LEAN_RUBRIC_BASE_URL), so with
+    any PROVIDER but "openai" this raises ValueError.
+
+    Returns:
+        list of RubricItemResult in the same order as items; a failed item has
+        score None and its error, and does not fail the rest of the batch
+    """
+    if PROVIDER != "openai":
+        raise ValueError(
+            f"Batch rubric scoring only supports PROVIDER 'openai', not {PROVIDER!r}; use LEAN_RUBRIC_BASE_URL "
+            "for another OpenAI-compatible server, or score items one at a time with compute_rubric_score_openai"
+        )
+    semaphore = asyncio.Semaphore(concurrency or CONCURRENCY)
+    client = get_client(MODEL, API_KEY)
+    pack_size = max(pack_size or PACK_SIZE, 1)
+    packed = pack_size > 1
+    results: list[RubricItemResult | None] = [None] * len(items)
+    # (index, solution_str, ground_truth, metadata, cache, cache_key) of items for the model.
+    pending = []
+    for i, (solution_str, ground_truth, extra_info) in enumerate(items):
+        extra_info = extra_info or {}
+        try:
+            score, source, cache, cache_key = precheck(
+                solution_str, ground_truth, extra_info, PACKED_FORMAT if packed else SINGLE_FORMAT
+            )
+        except Exception as e:
+            results[i] = RubricItemResult(None, error=f"{type(e).__name__}: {e}")
+            continue
+        if score is not None:
+            results[i] = RubricItemResult(score, source=source)
+        else:
+            pending.append((i, solution_str, ground_truth, extra_info.get("metadata"), cache, cache_key))
+
+    async def score_pack(pack: list[tuple]) -> None:
+        try:
+            async with semaphore:
+                if packed:
+                    scores, attempts = await client.score_packed(
+                        RUBRIC, [entry[1:4] for entry in pack], SCORE_MIN, SCORE_MAX
+                    )
+                else:
+                    _, solution_str, ground_truth, metadata, _, _ = pack[0]
+                    score, attempts = await client.score(
+                        RUBRIC, solution_str, ground_truth, metadata, SCORE_MIN, SCORE_MAX
+                    )
+                    scores = [score]
+        except RubricRequestError as e:
+            for entry in pack:
+                results[entry[0]] = RubricItemResult(None, error=str(e), attempts=e.attempts)
+            return
+        except Exception as e:
+            for entry in pack:
+                results[entry[0]] = RubricItemResult(None, error=f"{type(e).__name__}: {e}")
+            return
+        skipped = []
+        for entry, score in zip(pack, scores):
+            i, _, _, _, cache, cache_key = entry
+            if score is None:
+                skipped.append(entry)
+                continue
+            if cache is not None:
+                cache.put(cache_key, score)
+            results[i] = RubricItemResult(score, attempts=attempts)
+        if len(pack) == 1 and skipped:
+            results[pack[0][0]] = RubricItemResult(None, error="No score in model response", attempts=attempts)
+            return
+        await asyncio.gather(*(score_pack([entry]) for entry in skipped))
+
+    await asyncio.gather(*(
+        score_pack(pending[start:start + pack_size]) for start in range(0, len(pending), pack_size)
+    ))
+    for result in results:
+        record_event("compute_rubric_score_openai_batch_async", result.source if result.error is None else "error")
+    return results
+
+
+def compute_rubric_score_openai_batch(
+    items: list[tuple[str, str, dict | None]],
+    concurrency: int | None = None,
+    pack_size: int | None = None,
+) -> list[RubricItemResult]:
+    """
+    Blocking version of compute_rubric_score_openai_batch_async. It runs on
+    rubric_client's shared background loop, so consecutive calls reuse one connection
+    pool, and it can be called from inside a running event loop. Async callers should
+    await compute_rubric_score_openai_batch_async directly.
+    """
+    return run_sync(compute_rubric_score_openai_batch_async(items, concurrency, pack_size))
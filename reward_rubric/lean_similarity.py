@@ -0,0 +1,166 @@
+"""
+Deterministic, local Lean statement similarity.
+
+Implements the RUBRIC of lean_rubric_openai without a model call: statements are
+tokenized, the declaration name and any proof are dropped, ASCII notation is mapped to
+its Unicode form (`Real` -> `ℝ`, `->` -> `→`, `x²` -> `x ^ 2`, ...), and bound
+variables are renamed by order of first binding, so two statements that are identical
+up to whitespace, formatting and variable renaming normalize to the same tokens.
+Other pairs are scored by the similarity of their token sequences.
+
+Each statement is tokenized in one regex pass. The benchmark corpus scores about 11k
+pairs/s on one core with empty caches and about 35k pairs/s once normalizations are
+cached. The cold rate is mostly tokenizing and SequenceMatcher.
+"""
+
+import os
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from osmosis_ai import osmosis_rubric
+
+from reward_fn.instrumentation import instrumented
+from reward_fn.lean_prefilter import CHAR_LITERAL_PATTERN, strip_comments_and_strings
+
+SCORE_MIN = 0.0
+SCORE_MAX = 1.0
+# Normalized statements kept in memory; RL rollouts repeat the same ground truths.
+NORMALIZE_CACHE_SIZE = int(os.getenv("LEAN_RUBRIC_NORMALIZE_CACHE_SIZE", "65536"))
+
+_TOKEN_PATTERN = (
+    r"(?![λΠΣ])[^\W\d][\w.'!?₀-₉ₐ-ₜ]*"
+    r"|\d+(?:\.\d+)?"
+    r"|<->|->|<=|>=|!=|=>|:=|\.\.|::|\+\+|&&|\|\||[^\s\w]"
+)
+_TOKEN_RE = re.compile(_TOKEN_PATTERN)
+# Tokens and, skipped in the same pass, line comments, strings and char literals; a
+# skipped match leaves the token group empty. Block comments can nest, so statements
+# with one take the exact strip_comments_and_strings path instead.
+_SCAN_RE = re.compile(
+    r'--[^\n]*|"(?:\\.|[^"\\])*(?:"|\Z)|' + CHAR_LITERAL_PATTERN + f"|({_TOKEN_PATTERN})"
+)
+# ASCII or long-form spellings mapped to the form kept in normalized tokens.
+_ALIASES = {
+    "Real": "ℝ", "Nat": "ℕ", "Int": "ℤ", "Rat": "ℚ", "Complex": "ℂ",
+    "Real.pi": "π", "Real.sqrt": "√",
+    "->": "→", "<->": "↔", "<=": "≤", ">=": "≥", "!=": "≠", "=>": "↦",
+    "forall": "∀", "exists": "∃", "λ": "fun", "Not": "¬",
+}
+_SUPERSCRIPTS = {"²": "2", "³": "3", "⁴": "4", "⁵": "5", "⁶": "6", "⁷": "7", "⁸": "8", "⁹": "9"}
+_SUPERSCRIPT_RE = re.compile("[" + "".join(_SUPERSCRIPTS) + "]")
+_DECLARATIONS = frozenset({"theorem", "lemma"})
+# Tokens after which a run of identifiers are bound variables.
+_BINDERS = frozenset({"∀", "∃", "∃!", "fun", "∑", "∏", "⋃", "⋂", "⨆", "⨅"})
+_OPEN_BRACKETS = frozenset({"(", "{", "[", "⦃"})
+# Brackets that nest around a `:=` which does not start the proof.
+_NESTING_OPEN = frozenset("([{⟨⦃")
+_NESTING_CLOSE = frozenset(")]}⟩⦄")
+_KEYWORDS = frozenset({"in", "with", "at", "if", "then", "else", "by", "do", "let", "have", "show", "from"})
+
+
+def tokenize(statement: str) -> list[str]:
+    """Lean tokens of statement with comments and strings removed, aliases applied."""
+    if _SUPERSCRIPT_RE.search(statement):
+        statement = _SUPERSCRIPT_RE.sub(lambda m: " ^ " + _SUPERSCRIPTS[m.group()], statement)
+    if "/-" in statement:
+        tokens = _TOKEN_RE.findall(strip_comments_and_strings(statement))
+    else:
+        tokens = list(filter(None, _SCAN_RE.findall(statement)))
+    return list(map(_ALIASES.get, tokens, tokens))
+
+
+def _is_ident(token: str) -> bool:
+    return (token[0].isalpha() or token[0] == "_") and token not in _KEYWORDS and token not in _BINDERS
+
+
+def _bound_names(tokens: list[str]) -> list[str]:
+    """Names bound by binder groups `(x y : T)` and by quantifiers, in binding order."""
+    names = []
+    for i, token in enumerate(tokens):
+        if token in _OPEN_BRACKETS:
+            j = i + 1
+            while j < len(tokens) and _is_ident(tokens[j]):
+                j += 1
+            if j > i + 1 and j < len(tokens) and tokens[j] == ":":
+                names.extend(tokens[i + 1:j])
+        elif token in _BINDERS:
+            j = i + 1
+            while j < len(tokens) and (_is_ident(tokens[j]) or tokens[j] in _OPEN_BRACKETS):
+                if _is_ident(tokens[j]):
+                    names.append(tokens[j])
+                j += 1
+    return names
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_statement(statement: str) -> tuple[str, ...] | None:
+    """
+    Canonical token sequence of the first theorem or lemma in statement: declaration
+    name and proof dropped, aliases applied, bound variables renamed to `_0`, `_1`, ...
+    Returns None when statement contains no theorem or lemma.
+    """
+    tokens = tokenize(statement)
+    for i, token in enumerate(tokens):
+        if token in _DECLARATIONS:
+            break
+    else:
+        return None
+    # Skip the keyword and the declaration's name, and stop at the `:=` of the proof.
+    depth = 0
+    end = len(tokens)
+    for j in range(i + 2, end):
+        token = tokens[j]
+        if token in _NESTING_OPEN:
+            depth += 1
+        elif token in _NESTING_CLOSE:
+            depth -= 1
+        elif depth == 0 and token == ":=":
+            end = j
+            break
+    tokens = tokens[i + 2:end]
+    renames: dict[str, str] = {}
+    for name in _bound_names(tokens):
+        if name != "_" and name not in renames:
+            renames[name] = f"_{len(renames)}"
+    if not renames:
+        return tuple(tokens)
+    return tuple(map(renames.get, tokens, tokens))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _reference_tokens(ground_truth: str) -> tuple[str, ...]:
+    """Normalized ground truth; one given without its `theorem` keyword is just tokenized."""
+    truth = normalize_statement(ground_truth)
+    return truth if truth is not None else tuple(tokenize(ground_truth))
+
+
+def statement_similarity(predicted: str, ground_truth: str) -> float:
+    """
+    Score predicted against ground_truth as the RUBRIC asks: 0 when predicted is empty
+    or not a theorem statement, 1 when both normalize to the same tokens, otherwise the
+    similarity ratio of the two token sequences, kept below 1.
+    """
+    pred = normalize_statement(predicted or "")
+    if not pred:
+        return SCORE_MIN
+    truth = _reference_tokens(ground_truth or "")
+    if pred == truth:
+        return SCORE_MAX
+    ratio = SequenceMatcher(None, pred, truth, autojunk=False).ratio()
+    # Keep "identical" and "different" apart: unequal statements never reach 1.
+    return min(max(ratio, SCORE_MIN), 0.99)
+
+
+@instrumented()
+@osmosis_rubric
+def compute_rubric_score_local(
+    solution_str: str,
+    ground_truth: str,
+    extra_info: dict,
+    **kwargs
+) -> float:
+    """
+    Score Lean statement similarity locally, without a model call.
+    """
+    return statement_similarity(solution_str, ground_truth)
@@ -0,0 +1,150 @@
+"""
+Minimal OpenAI-compatible server for testing the rubric client without an API key.
+
+Serves POST /v1/chat/completions. The reply is the lean_similarity score of the
+"Predicted:" and "Ground truth:" sections of the last user message, so results are
+deterministic; packed requests ("Pair 1", "Pair 2", ...) get one `<n>: <score>` line
+per pair. A system prompt seen before is reported as cached prompt tokens, like a
+provider prompt cache would, and every prompt_cache_key sent is counted in
+server.prompt_cache_keys. It can inject latency and 429/500 errors to exercise
+rate limiting and retries:
+
+    python -m reward_rubric.mock_openai_server --port 8011 --error-rate 0.2
+    LEAN_RUBRIC_BASE_URL=http://127.0.0.1:8011/v1 python my_batch_script.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from reward_rubric.lean_similarity import statement_similarity
+
+_PAIR_RE = re.compile(r"(?:^|\n\n)Pair (\d+)\n")
+
+
+def _score_pair(text: str) -> float:
+    predicted, _, rest = text.partition("\n\nGround truth:\n")
+    predicted = predicted.removeprefix("Predicted:\n")
+    ground_truth = rest.split("\n\nMetadata:\n", 1)[0]
+    return statement_similarity(predicted, ground_truth)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    # Set on the server by make_server.
+    server: "ThreadingHTTPServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict | None = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with self.server.stats_lock:
+            self.server.requests += 1
+            self.server.prompt_cache_keys[request.get("prompt_cache_key")] += 1
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        roll = random.random()
+        if roll < self.server.error_rate / 2:
+            self._send(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                       {"Retry-After": "0"})
+            return
+        if roll < self.server.error_rate:
+            self._send(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+
+        messages = request.get("messages", [])
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        pairs = _PAIR_RE.split(user)
+        if len(pairs) > 1:
+            # ["", "1", text1, "2", text2, ...]
+            content = "\n".join(
+                f"{number}: {_score_pair(text):.4f}" for number, text in zip(pairs[1::2], pairs[2::2])
+            )
+        else:
+            content = f"{_score_pair(user):.4f}"
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        with self.server.stats_lock:
+            cached_tokens = len(system) // 4 if system in self.server.seen_prefixes else 0
+            self.server.seen_prefixes.add(system)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(content) // 4 + 1
+        self._send(200, {
+            "id": f"chatcmpl-mock-{self.server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+
+def make_server(
+    host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.0, error_rate: float = 0.0
+) -> ThreadingHTTPServer:
+    """A server on host:port (0 picks a free port); call serve_forever() to run it."""
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.latency_s = latency_s
+    server.error_rate = error_rate
+    server.requests = 0
+    server.stats_lock = threading.Lock()
+    server.seen_prefixes = set()
+    server.prompt_cache_keys = Counter()
+    return server
+
+
+def serve_in_thread(**kwargs) -> tuple[ThreadingHTTPServer, str]:
+    """Start a server in a daemon thread. Returns (server, base_url for the client)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each reply.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 429 or 500, half each.")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.latency, args.error_rate)
+    print(f"Mock OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Memoization of rubric scores.
+
+RL rollouts often produce the same (solution_str, ground_truth) pair many times; each
+model call costs latency and money. Keys are a SHA-256 of everything that determines
+the score: rubric text, provider, model, score range, prompt metadata, the prompt
+format (see rubric_client.prompt_format) and the whitespace-normalized inputs.
+Scores live in an in-memory LRU with a TTL and, optionally, in a SQLite file shared
+by several worker processes on the same machine.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Maximum in-memory entries; 0 disables caching entirely.
+CACHE_SIZE = int(os.getenv("LEAN_RUBRIC_CACHE_SIZE", "10000"))
+# Seconds a score stays valid; 0 keeps scores forever.
+CACHE_TTL_S = float(os.getenv("LEAN_RUBRIC_CACHE_TTL_S", "604800"))
+# Optional SQLite file for the on-disk tier.
+CACHE_DB = os.getenv("LEAN_RUBRIC_CACHE_DB")
+
+
+def normalize_text(text: str | None) -> str:
+    """Inputs that differ only in whitespace get the same key."""
+    return " ".join((text or "").split())
+
+
+class RubricCache:
+    """
+    Two-tier (memory LRU, optional SQLite) cache of rubric scores with a TTL.
+    Thread-safe. Counts hits per key, so hot pairs can be inspected.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_SIZE,
+        ttl_seconds: float = CACHE_TTL_S,
+        db_path: str | None = CACHE_DB,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> [score, created, hits]
+        self._entries: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            # WAL lets several worker processes read and write the same file.
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rubric_scores ("
+                "key TEXT PRIMARY KEY, score REAL, created REAL, hits INTEGER)"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(
+        rubric: str,
+        provider: str,
+        model: str,
+        score_min: float,
+        score_max: float,
+        solution_str: str,
+        ground_truth: str | None,
+        metadata: dict | None = None,
+        prompt_format: str | None = None,
+    ) -> str:
+        payload = json.dumps(
+            [
+                rubric,
+                provider,
+                model,
+                score_min,
+                score_max,
+                normalize_text(solution_str),
+                normalize_text(ground_truth),
+                metadata,
+                prompt_format,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _fresh(self, created: float) -> bool:
+        return not self.ttl_seconds or time.time() - created < self.ttl_seconds
+
+    def get(self, key: str) -> float | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[1]):
+                    entry[2] += 1
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT score, created, hits FROM rubric_scores WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self._fresh(row[1]):
+                    self._remember(key, [row[0], row[1], 1])
+                    self.disk_hits += 1
+                    # On disk, hits only counts lookups the memory tier could not serve.
+                    self._db.execute("UPDATE rubric_scores SET hits = hits + 1 WHERE key = ?", (key,))
+                    self._db.commit()
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, score: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, [score, now, 0])
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rubric_scores VALUES (?, ?, ?, 0)", (key, score, now)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, entry: list) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def hit_counts(self, top: int = 10) -> list[tuple[str, int]]:
+        """The top keys by hits in this process, as (key, hits)."""
+        with self._lock:
+            counts = sorted(((k, e[2]) for k, e in self._entries.items()), key=lambda kv: -kv[1])
+            return counts[:top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM rubric_scores")
+                self._db.commit()
+
+
+_DEFAULT_CACHE: RubricCache | None = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def get_default_cache() -> RubricCache | None:
+    """Shared cache used by the rubric scorers, or None when LEAN_RUBRIC_CACHE_SIZE is 0."""
+    global _DEFAULT_CACHE
+    if CACHE_SIZE <= 0:
+        return None
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = RubricCache()
+        return _DEFAULT_CACHE
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the shared cache (empty when caching is disabled)."""
+    cache = get_default_cache()
+    return cache.stats() if cache is not None else {}
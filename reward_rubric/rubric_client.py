@@ -0,0 +1,376 @@
+"""
+Pooled, rate-limited async client for rubric scoring against OpenAI-compatible APIs.
+
+One AsyncOpenAI client (and its HTTP connection pool) is kept per event loop and
+reused by every request. Requests go through two process-wide token buckets, one for
+requests per minute and one for tokens per minute, and 429/5xx/connection errors are
+retried with full-jitter exponential backoff, honoring Retry-After when the server
+sends it. LEAN_RUBRIC_BASE_URL points the client at another server, e.g.
+reward_rubric.mock_openai_server for local testing.
+
+Requests put the static rubric first, as the system message, and only the pairs being
+scored in the user message, so the provider's prompt cache can serve the shared
+prefix. Several pairs can be packed into one request (score_packed), which amortizes
+the rubric over all of them. Token usage of every request, including cached prompt
+tokens, is logged and summed in usage_stats().
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import Counter
+from dataclasses import dataclass
+
+import openai
+from openai import AsyncOpenAI
+
+from reward_fn.instrumentation import error_category, instrumented, record_event
+
+# OpenAI-compatible endpoint; None uses the SDK default (or OPENAI_BASE_URL).
+BASE_URL = os.getenv("LEAN_RUBRIC_BASE_URL") or None
+# Requests in flight at once per batch.
+CONCURRENCY = int(os.getenv("LEAN_RUBRIC_CONCURRENCY", "16"))
+# Rate limits of the API key; 0 disables a limit.
+REQUESTS_PER_MINUTE = float(os.getenv("LEAN_RUBRIC_RPM", "500"))
+TOKENS_PER_MINUTE = float(os.getenv("LEAN_RUBRIC_TPM", "200000"))
+MAX_RETRIES = int(os.getenv("LEAN_RUBRIC_MAX_RETRIES", "5"))
+REQUEST_TIMEOUT_S = float(os.getenv("LEAN_RUBRIC_TIMEOUT_S", "60"))
+# Backoff before retry n is uniform in [0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2**n)].
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+# Output tokens reserved per scored pair before the real usage is known.
+MAX_OUTPUT_TOKENS = 16
+# Pairs packed into one request by the batch scorers; 1 sends each pair on its own.
+PACK_SIZE = int(os.getenv("LEAN_RUBRIC_PACK_SIZE", "8"))
+# Send a prompt_cache_key derived from the rubric, so requests sharing the rubric are
+# routed to the same prompt cache; set to 0 for servers that reject the parameter.
+USE_PROMPT_CACHE_KEY = os.getenv("LEAN_RUBRIC_PROMPT_CACHE_KEY", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+# A `<pair number>: <score>` line. The delimiter is required and never ".", so a bare
+# "1.0" is not read as pair 1 scoring 0.
+_PACKED_SCORE_RE = re.compile(rf"^\s*(?:pair\s+)?(\d+)\s*[:)=]\s*({_NUMBER})", re.MULTILINE | re.IGNORECASE)
+# Appended to the rubric for packed requests; it is static too, so it stays in the prefix.
+PACKED_INSTRUCTIONS = """
+You will be given several numbered pairs. Score each pair independently by the rules
+above. Instead of a single number, respond with one line per pair, in order,
+formatted as `<pair number>: <score>`, and nothing else.
+"""
+
+_USAGE: Counter = Counter()
+_USAGE_LOCK = threading.Lock()
+
+
+class RubricRequestError(RuntimeError):
+    """A rubric request that failed for good, after attempts tries."""
+
+    def __init__(self, error: Exception, attempts: int):
+        super().__init__(f"{type(error).__name__} after {attempts} attempt(s): {error}")
+        self.attempts = attempts
+
+
+class TokenBucket:
+    """
+    Refills at per_minute / 60 units per second up to per_minute units.
+    Thread-safe, so buckets can be shared by several event loops; waiting happens
+    outside the lock with asyncio.sleep.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) the difference once real usage is known."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+REQUEST_BUCKET = TokenBucket(REQUESTS_PER_MINUTE)
+TOKEN_BUCKET = TokenBucket(TOKENS_PER_MINUTE)
+
+
+@dataclass
+class RubricItemResult:
+    """Score of one batch item, or why it has none."""
+
+    score: float | None
+    error: str | None = None
+    attempts: int = 0
+    # "local", "cache" or "model".
+    source: str = "model"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (4 characters per token), good enough for rate limiting."""
+    return len(text) // 4 + 1
+
+
+def build_messages(
+    rubric: str, solution_str: str, ground_truth: str | None, metadata: dict | None = None
+) -> list[dict]:
+    """Chat messages scoring one pair: the rubric as system prompt, the pair as user turn."""
+    user = f"Predicted:\n{solution_str}\n\nGround truth:\n{ground_truth or ''}"
+    if metadata:
+        user += f"\n\nMetadata:\n{metadata}"
+    return [{"role": "system", "content": rubric}, {"role": "user", "content": user}]
+
+
+def build_packed_messages(rubric: str, pairs: list[tuple[str, str | None, dict | None]]) -> list[dict]:
+    """Chat messages scoring several (solution_str, ground_truth, metadata) pairs at once."""
+    parts = []
+    for number, (solution_str, ground_truth, metadata) in enumerate(pairs, start=1):
+        part = f"Pair {number}\nPredicted:\n{solution_str}\n\nGround truth:\n{ground_truth or ''}"
+        if metadata:
+            part += f"\n\nMetadata:\n{metadata}"
+        parts.append(part)
+    return [
+        {"role": "system", "content": rubric.rstrip() + "\n" + PACKED_INSTRUCTIONS},
+        {"role": "user", "content": "\n\n".join(parts)},
+    ]
+
+
+def prompt_format(rubric: str, packed: bool = False) -> str:
+    """
+    Names the prompt template scores are produced with, e.g. "packed-3f2a9c...". Single
+    and packed requests word the task differently, so their scores are cached apart,
+    and editing a template invalidates the scores cached under it.
+    """
+    if packed:
+        messages = build_packed_messages(rubric, [("{predicted}", "{ground_truth}", None)])
+    else:
+        messages = build_messages(rubric, "{predicted}", "{ground_truth}")
+    digest = hashlib.sha256(json.dumps(messages).encode()).hexdigest()[:16]
+    return f"{'packed' if packed else 'single'}-{digest}"
+
+
+def parse_scores(content: str, count: int, score_min: float, score_max: float) -> list[float | None]:
+    """
+    Scores of a packed reply, by pair number. Unless the reply numbers its lines
+    exactly 1..count, in order, it is not trusted and every score is None. A reply to
+    a single pair may also be just the number.
+    """
+    matches = list(_PACKED_SCORE_RE.finditer(content or ""))
+    if [int(match.group(1)) for match in matches] != list(range(1, count + 1)):
+        if count == 1 and not matches and _NUMBER_RE.fullmatch((content or "").strip()):
+            return [parse_score(content, score_min, score_max)]
+        return [None] * count
+    return [min(max(float(match.group(2)), score_min), score_max) for match in matches]
+
+
+def parse_score(content: str, score_min: float, score_max: float) -> float:
+    """First number in the model's reply, clamped to the score range."""
+    match = _NUMBER_RE.search(content or "")
+    if match is None:
+        raise ValueError(f"No score in model response: {(content or '')[:200]!r}")
+    return min(max(float(match.group()), score_min), score_max)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RubricClient:
+    """Chat-completions scorer sharing one AsyncOpenAI connection pool."""
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str | None = None,
+        base_url: str | None = BASE_URL,
+        timeout: float = REQUEST_TIMEOUT_S,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.model = model
+        self.max_retries = max_retries
+        # Retries are ours, so they go through the rate limiter too.
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY") or "unused",
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,
+        )
+
+    @instrumented("rubric_request")
+    async def _complete(self, messages: list[dict], pairs: int) -> tuple[str, int]:
+        """
+        Send one chat completion under the rate limits, retrying transient errors.
+        Returns (reply content, attempts).
+        """
+        estimate = sum(estimate_tokens(m["content"]) for m in messages) + MAX_OUTPUT_TOKENS * pairs
+        extra = {}
+        if USE_PROMPT_CACHE_KEY:
+            extra["prompt_cache_key"] = "rubric-" + hashlib.sha256(messages[0]["content"].encode()).hexdigest()[:16]
+        attempt = 0
+        while True:
+            attempt += 1
+            await REQUEST_BUCKET.acquire()
+            await TOKEN_BUCKET.acquire(estimate)
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model, messages=messages, extra_body=extra or None
+                )
+            except Exception as e:
+                record_event("rubric_request", error_category(e))
+                if attempt > self.max_retries or not _is_retryable(e):
+                    raise RubricRequestError(e, attempt) from e
+                backoff = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempt - 1)))
+                record_event("rubric_request", "retry")
+                await asyncio.sleep(max(backoff, _retry_after(e) or 0.0))
+                continue
+            if response.usage is not None:
+                TOKEN_BUCKET.adjust(response.usage.total_tokens - estimate)
+                _record_usage(response.usage, pairs)
+            return response.choices[0].message.content, attempt
+
+    async def score(
+        self,
+        rubric: str,
+        solution_str: str,
+        ground_truth: str | None,
+        metadata: dict | None,
+        score_min: float,
+        score_max: float,
+    ) -> tuple[float, int]:
+        """
+        Returns (score, attempts). Raises RubricRequestError once retries are exhausted
+        or the error is not retryable.
+        """
+        messages = build_messages(rubric, solution_str, ground_truth, metadata)
+        content, attempts = await self._complete(messages, pairs=1)
+        try:
+            return parse_score(content, score_min, score_max), attempts
+        except ValueError as e:
+            raise RubricRequestError(e, attempts) from e
+
+    async def score_packed(
+        self,
+        rubric: str,
+        pairs: list[tuple[str, str | None, dict | None]],
+        score_min: float,
+        score_max: float,
+    ) -> tuple[list[float | None], int]:
+        """
+        Score several (solution_str, ground_truth, metadata) pairs in one request.
+        Returns (scores, attempts); scores are all None when the reply did not number
+        its scores exactly 1..len(pairs) (see parse_scores).
+        """
+        content, attempts = await self._complete(build_packed_messages(rubric, pairs), pairs=len(pairs))
+        return parse_scores(content, len(pairs), score_min, score_max), attempts
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def _record_usage(usage, pairs: int) -> None:
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+    logger.info(
+        "rubric request: %d pair(s), %d prompt tokens (%d cached), %d completion tokens",
+        pairs, usage.prompt_tokens, cached, usage.completion_tokens,
+    )
+    with _USAGE_LOCK:
+        _USAGE["requests"] += 1
+        _USAGE["pairs"] += pairs
+        _USAGE["prompt_tokens"] += usage.prompt_tokens
+        _USAGE["cached_tokens"] += cached
+        _USAGE["completion_tokens"] += usage.completion_tokens
+
+
+def usage_stats() -> dict:
+    """Token usage summed over all rubric requests, with per-pair averages."""
+    with _USAGE_LOCK:
+        stats = dict(_USAGE)
+    pairs = stats.get("pairs", 0)
+    if pairs:
+        stats["prompt_tokens_per_pair"] = stats["prompt_tokens"] / pairs
+        stats["uncached_prompt_tokens_per_pair"] = (stats["prompt_tokens"] - stats["cached_tokens"]) / pairs
+    return stats
+
+
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_LOCK = threading.Lock()
+
+
+def run_sync(coro):
+    """
+    Run coro on a background event loop shared by blocking callers and wait for its
+    result. That loop's pooled client, and so its connections, outlive each call. It
+    also works when called from code that is itself running inside an event loop.
+    """
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="rubric-client-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _LOOP).result()
+
+
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple, RubricClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_client(model: str, api_key: str | None = None, base_url: str | None = BASE_URL) -> RubricClient:
+    """
+    Shared client for the running event loop; HTTP connections cannot be used from
+    another loop, so each loop gets its own pool.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _CLIENTS.setdefault(loop, {})
+    key = (model, api_key, base_url)
+    if key not in clients:
+        clients[key] = RubricClient(model, api_key=api_key, base_url=base_url)
+    return clients[key]
+
+
+async def close_clients() -> None:
+    """Close the running loop's clients, e.g. before asyncio.run returns."""
+    clients = _CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
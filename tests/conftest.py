@@ -0,0 +1,66 @@
+import sys
+import textwrap
+
+import pytest
+
+from reward_fn import lean_repl
+from reward_rubric import lean_rubric_openai, rubric_client
+from reward_rubric.mock_openai_server import serve_in_thread
+
+# Stands in for `lake exe repl`: answers every command after FAKE_REPL_DELAY seconds,
+# reports an error for sources containing "sorry_err" and never answers "hang".
+FAKE_REPL = textwrap.dedent(
+    """
+    import json, os, sys, time
+
+    delay = float(os.environ.get("FAKE_REPL_DELAY", "0"))
+    env = 0
+    buf = ""
+    for line in sys.stdin:
+        if line.strip():
+            buf += line
+            continue
+        if not buf:
+            continue
+        cmd = json.loads(buf)
+        buf = ""
+        if env:
+            time.sleep(delay)
+        if "hang" in cmd.get("cmd", ""):
+            time.sleep(600)
+        out = {"env": env}
+        if "sorry_err" in cmd.get("cmd", ""):
+            out["messages"] = [{"severity": "error", "pos": {"line": 1, "column": 3}, "data": "bad"}]
+        env += 1
+        print(json.dumps(out))
+        print()
+        sys.stdout.flush()
+    """
+)
+
+
+@pytest.fixture
+def fake_repl(tmp_path, monkeypatch):
+    """Directory to use as lean_env_dir, with REPL_COMMAND pointing at FAKE_REPL."""
+    script = tmp_path / "repl.py"
+    script.write_text(FAKE_REPL)
+    monkeypatch.setattr(lean_repl, "REPL_COMMAND", [sys.executable, str(script)])
+    return tmp_path
+
+
+@pytest.fixture
+def mock_openai(monkeypatch):
+    """
+    A mock_openai_server that rubric_client talks to, with rate limits and the rubric
+    cache off, near-zero retry backoff and usage_stats reset.
+    """
+    server, base_url = serve_in_thread()
+    monkeypatch.setattr(rubric_client.get_client, "__defaults__", (None, base_url))
+    monkeypatch.setattr(rubric_client, "REQUEST_BUCKET", rubric_client.TokenBucket(0))
+    monkeypatch.setattr(rubric_client, "TOKEN_BUCKET", rubric_client.TokenBucket(0))
+    monkeypatch.setattr(rubric_client, "BACKOFF_BASE_S", 0.001)
+    monkeypatch.setattr(lean_rubric_openai, "get_default_cache", lambda: None)
+    rubric_client._USAGE.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
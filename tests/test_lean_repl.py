@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from reward_fn.lean_repl import LeanWorkerPool
+
+PROOF = "import Mathlib\ntheorem a : True := trivial"
+
+
+def test_queueing_for_a_worker_does_not_count_against_the_timeout(fake_repl, monkeypatch):
+    # 16 checks of 0.3s each on 2 workers queue for over 2s, well past the 1s wall limit.
+    monkeypatch.setenv("FAKE_REPL_DELAY", "0.3")
+    pool = LeanWorkerPool(size=2, lean_env_dir=fake_repl, max_wait_s=30)
+    pool.prewarm()
+    try:
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda _: pool.check(PROOF, timeout=1), range(16)))
+    finally:
+        pool.close()
+    assert [(r.reward, r.timed_out, r.source) for r in results] == [(1.0, False, "pool")] * 16
+    assert all(r.wall_time_s < 1 for r in results)
+
+
+def test_check_runs_cold_when_no_worker_frees_up_in_time(fake_repl, monkeypatch):
+    monkeypatch.setenv("FAKE_REPL_DELAY", "1")
+    pool = LeanWorkerPool(size=1, lean_env_dir=fake_repl, max_wait_s=0.2)
+    pool.prewarm()
+    try:
+        busy = threading.Thread(target=pool.check, args=(PROOF,), kwargs={"timeout": 5})
+        busy.start()
+        while pool.stats()["idle_workers"]:
+            pass
+        assert pool.check(PROOF, timeout=5) is None
+        assert pool.check_statements([PROOF, PROOF], timeout=5) == [None, None]
+        busy.join()
+    finally:
+        pool.close()
+
+
+def test_check_still_times_out_on_a_slow_check(fake_repl):
+    pool = LeanWorkerPool(size=1, lean_env_dir=fake_repl)
+    try:
+        with pytest.raises(TimeoutError):
+            pool.check("import Mathlib\ntheorem hang : True := trivial", timeout=0.5)
+    finally:
+        pool.close()
+
+
+def test_only_sources_with_exactly_the_warm_imports_run_warm(fake_repl):
+    pool = LeanWorkerPool(size=1, lean_env_dir=fake_repl)
+    try:
+        assert pool.check("theorem a : True := trivial", timeout=5) is None
+        assert pool.check("import Mathlib.Tactic\ntheorem a : True := trivial", timeout=5) is None
+        results = pool.check_statements(["theorem a : True", PROOF], timeout=5)
+        assert results[0] is None and results[1].reward == 1.0
+    finally:
+        pool.close()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from reward_fn import lean_reward
+from reward_fn.lean_repl import CheckCancelled, LeanWorkerPool
+from reward_fn.lean_reward import (
+    SKIPPED_REASON,
+    lean_proof_reward_batch,
+    lean_statement_check_batch,
+    lean_verify,
+    lean_verify_first_k,
+)
+
+VALID = "import Mathlib\ntheorem a : True := trivial"
+INVALID = "import Mathlib\ntheorem b : sorry_err := trivial"
+HANG = "import Mathlib\ntheorem hang : True := trivial"
+
+
+@pytest.fixture
+def pool(fake_repl, monkeypatch):
+    """A warm pool of two fake workers that lean_reward uses, with its cache off."""
+    pool = LeanWorkerPool(size=2, lean_env_dir=fake_repl, max_wait_s=5)
+    pool.prewarm()
+    monkeypatch.setattr(lean_reward, "get_default_pool", lambda: pool)
+    monkeypatch.setattr(lean_reward, "get_default_cache", lambda: None)
+    yield pool
+    pool.close()
+
+
+def test_batch_checks_run_on_the_pool_in_order(pool):
+    results = lean_proof_reward_batch([(VALID, None), (INVALID, None)] * 4, max_workers=4)
+    assert [reward for reward, _ in results] == [1.0, 0.0] * 4
+    assert "bad" in results[1][1]
+    assert pool.stats()["workers"] == 2
+
+
+def test_sources_without_the_warm_imports_run_cold(pool, monkeypatch, tmp_path):
+    monkeypatch.setattr(lean_reward, "LEAN_ENV_DIR", tmp_path / "missing")
+    result = lean_verify("theorem a : True := trivial")
+    assert result.source == "process" and not result.definitive
+
+
+def test_checks_that_find_no_idle_worker_run_cold(pool, monkeypatch, tmp_path):
+    monkeypatch.setattr(lean_reward, "LEAN_ENV_DIR", tmp_path / "missing")
+    monkeypatch.setattr(pool, "max_wait_s", 0.1)
+    busy = [threading.Thread(target=pool.check, args=(HANG,), kwargs={"timeout": 1}) for _ in range(2)]
+    for thread in busy:
+        thread.start()
+    while pool.stats()["idle_workers"]:
+        time.sleep(0.01)
+    assert lean_verify(VALID).source == "process"
+    for thread in busy:
+        thread.join()
+
+
+def test_cancelling_a_check_kills_its_worker(pool):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    start = time.monotonic()
+    with pytest.raises(CheckCancelled):
+        pool.check(HANG, timeout=30, cancel=cancel)
+    assert time.monotonic() - start < 5
+    assert pool.check(VALID, timeout=5).reward == 1.0
+
+
+def test_cancelling_statement_checks(pool):
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    with pytest.raises(CheckCancelled):
+        lean_statement_check_batch([VALID, HANG, VALID], cancel=cancel)
+    assert pool.check_statements([VALID], timeout=5)[0].reward == 1.0
+
+
+def test_first_k_cancels_the_rest_of_a_solved_problem(pool):
+    items = [("p", VALID), ("q", INVALID), ("p", HANG), ("p", HANG)]
+    start = time.monotonic()
+    results = lean_verify_first_k(items, k=1, max_workers=2)
+    assert time.monotonic() - start < 10
+    assert [r.reward for r in results] == [1.0, 0.0, 0.0, 0.0]
+    assert [r.source for r in results] == ["pool", "pool", "skipped", "skipped"]
+    assert results[2].reason == SKIPPED_REASON
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from reward_rubric import lean_cascade, lean_rubric_openai, rubric_client
+from reward_rubric.lean_rubric_openai import compute_rubric_score_openai_batch
+from reward_rubric.lean_similarity import statement_similarity
+from reward_rubric.rubric_client import TokenBucket, parse_scores, usage_stats
+
+ITEMS = [
+    (
+        f"theorem t{i} (x y : Nat) : x * y + {i} = y + x := by simp",
+        f"theorem t{i} (a b : Nat) : a + b + {i} = b + a + {i} := by sorry",
+        None,
+    )
+    for i in range(16)
+]
+
+
+def local_scores(items):
+    return [pytest.approx(statement_similarity(solution, truth), abs=1e-3) for solution, truth, _ in items]
+
+
+@pytest.mark.parametrize("pack_size", [1, 8])
+def test_batch_scores_come_back_in_input_order(mock_openai, pack_size):
+    results = compute_rubric_score_openai_batch(ITEMS, pack_size=pack_size)
+    assert [r.score for r in results] == local_scores(ITEMS)
+    assert {(r.source, r.error) for r in results} == {("model", None)}
+    assert mock_openai.requests == len(ITEMS) // pack_size
+
+
+def test_a_failing_item_does_not_fail_the_batch(mock_openai, monkeypatch):
+    precheck = lean_rubric_openai.precheck
+
+    def failing_precheck(solution_str, *args):
+        if solution_str == ITEMS[3][0]:
+            raise ValueError("broken item")
+        return precheck(solution_str, *args)
+
+    monkeypatch.setattr(lean_rubric_openai, "precheck", failing_precheck)
+    results = compute_rubric_score_openai_batch(ITEMS, pack_size=4)
+    assert results[3].score is None and results[3].error == "ValueError: broken item"
+    rest = ITEMS[:3] + ITEMS[4:]
+    assert [r.score for r in results[:3] + results[4:]] == local_scores(rest)
+
+
+def test_requests_that_keep_failing_report_their_error(mock_openai):
+    mock_openai.error_rate = 1.0
+    results = compute_rubric_score_openai_batch(ITEMS[:2], pack_size=1)
+    assert all(r.score is None for r in results)
+    assert all(r.attempts == rubric_client.MAX_RETRIES + 1 for r in results)
+    assert all(("RateLimitError" in r.error or "InternalServerError" in r.error) for r in results)
+
+
+def test_429_and_5xx_are_retried_with_exponential_backoff(mock_openai, monkeypatch):
+    mock_openai.error_rate = 1.0
+    bounds = []
+
+    def uniform(low, high):
+        # The second retry succeeds.
+        bounds.append(high)
+        if len(bounds) == 2:
+            mock_openai.error_rate = 0.0
+        return 0.0
+
+    monkeypatch.setattr(random, "uniform", uniform)
+    results = compute_rubric_score_openai_batch(ITEMS[:8], pack_size=8)
+    assert [r.score for r in results] == local_scores(ITEMS[:8])
+    assert {r.attempts for r in results} == {3}
+    assert bounds == [rubric_client.BACKOFF_BASE_S, 2 * rubric_client.BACKOFF_BASE_S]
+    assert mock_openai.requests == 3
+
+
+def test_token_bucket_waits_for_refill():
+    async def take():
+        bucket = TokenBucket(600)  # 10 per second
+        await bucket.acquire(600)
+        start = time.monotonic()
+        await bucket.acquire(3)
+        return time.monotonic() - start
+
+    assert 0.25 < asyncio.run(take()) < 1
+
+
+def test_requests_wait_for_the_request_bucket(mock_openai, monkeypatch):
+    bucket = TokenBucket(600)
+    bucket.tokens = 0
+    monkeypatch.setattr(rubric_client, "REQUEST_BUCKET", bucket)
+    start = time.monotonic()
+    results = compute_rubric_score_openai_batch(ITEMS[:4], pack_size=1)
+    assert all(r.score is not None for r in results)
+    # 10 requests per second, starting from an empty bucket.
+    assert time.monotonic() - start >= 0.35
+
+
+def test_prompt_cache_key_and_cached_tokens(mock_openai):
+    compute_rubric_score_openai_batch(ITEMS[:4], pack_size=1)
+    compute_rubric_score_openai_batch(ITEMS[4:8], pack_size=1)
+    keys = mock_openai.prompt_cache_keys
+    assert len(keys) == 1 and next(iter(keys)).startswith("rubric-") and sum(keys.values()) == 8
+    stats = usage_stats()
+    assert stats["requests"] == 8 and stats["pairs"] == 8
+    # The second batch at least finds the system prompt cached.
+    assert stats["cached_tokens"] >= 4 * (len(lean_rubric_openai.RUBRIC) // 4)
+
+
+def test_prompt_cache_key_can_be_turned_off(mock_openai, monkeypatch):
+    monkeypatch.setattr(rubric_client, "USE_PROMPT_CACHE_KEY", False)
+    compute_rubric_score_openai_batch(ITEMS[:2], pack_size=1)
+    assert mock_openai.prompt_cache_keys == {None: 2}
+
+
+def test_packed_replies_must_number_pairs_one_to_n():
+    assert parse_scores("1: 0.5\n2) 1\nPair 3 = 0.25", 3, 0.0, 1.0) == [0.5, 1.0, 0.25]
+    assert parse_scores("1.0", 2, 0.0, 1.0) == [None, None]
+    assert parse_scores("1: 0.5\n3: 1", 2, 0.0, 1.0) == [None, None]
+    assert parse_scores("2: 1\n1: 0", 2, 0.0, 1.0) == [None, None]
+    assert parse_scores("0.7", 1, 0.0, 1.0) == [0.7]
+    assert parse_scores("1: 2", 1, 0.0, 1.0) == [1.0]
+
+
+def test_cascade_decides_each_item_at_the_cheapest_stage(mock_openai):
+    exact = ("theorem a (x : ℝ) : x ^ 2 ≥ 0 := by positivity", "theorem b (y : Real) : y^2 ≥ 0", None)
+    not_a_theorem = ("I could not formalize this.", "theorem c : 1 = 1", None)
+    items = [ITEMS[0], exact, not_a_theorem, ITEMS[1]]
+    results = lean_cascade.lean_cascade_batch(items, stages=("lexical", "exact", "llm"))
+    assert [r.stage for r in results] == ["llm", "exact", "lexical", "llm"]
+    assert [r.score for r in results] == [*local_scores(ITEMS[:1]), 1.0, 0.0, *local_scores(ITEMS[1:2])]